@@ -17,21 +17,20 @@ Usage:
 """
 
 
+from startup import report_startup  # first import: starts the startup clock
 import sys
 import logging
 import pprint as pp
-import pandas as pd
 from PyQt5.QtWidgets import (QApplication, QGroupBox, QListWidget, QVBoxLayout, QTableWidget,
                              QLabel, QWidget, QHBoxLayout, QPushButton, QLineEdit, QFileDialog,
-                             QSlider, QGridLayout, QSplitter, QTableWidgetItem)
-from PyQt5.QtWebEngineWidgets import QWebEngineView
+                             QSlider, QGridLayout, QSplitter, QTableWidgetItem, QTabWidget)
 from PyQt5.QtGui import QPixmap, QPainter
 from PyQt5 import QtCore, QtPrintSupport
-from oemof.tools import logger
-from oemof.tools import economics
-from oemof import solph
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from sizing_params import SizingParams, MODE_PV_BESS  # light, the engine is imported in the solver process
+from result_cache import ResultCache
+from simulation_worker import SimulationWorker
+from charts import GaugeView, TimeSeriesView, cleanup_pages
+from telemetry import from_environment
 
 
 
@@ -47,6 +46,20 @@ class EnergyModelApp(QWidget):
     def init_ui(self):
         self.setWindowTitle('EcoSizer: Optimal Home Solar + Battery Sizing Tool')
         self.setGeometry(100, 100, 1600, 920)
+        # Solver runs in a background process, results come back through signals;
+        # the persistent model is only updated between runs, so nudging a slider re-solves warm
+        self.worker = SimulationWorker(engine_kwargs={"cache": ResultCache(), "persistent": True}, parent=self)
+        self.worker.stage.connect(self.show_stage)
+        self.worker.finished_case.connect(self.show_results)
+        self.worker.failed.connect(self.show_failure)
+        self.worker.cancelled.connect(self.show_cancelled)
+        # Stage timings of the solver process and of the window; logged and, if
+        # $ECOSIZER_TELEMETRY names a file, appended to it as JSON lines
+        self.telemetry = from_environment()
+        self.worker.telemetry.connect(self.record_telemetry)
+        self.worker.start()
+        self.pending_simulations = 0
+        self.result = None  # last SizingResult shown, the base of the financial report
 
         # Create a splitter to divide the main window into three sections
         splitter = QSplitter(QtCore.Qt.Horizontal)
@@ -75,6 +88,11 @@ class EnergyModelApp(QWidget):
         self.btn_run_simulation.setFixedSize(160, 30)
         self.btn_run_simulation.setCheckable(True)
         self.btn_run_simulation.clicked.connect(self.toggle)
+
+        self.btn_cancel_simulation = QPushButton('Cancel',self, styleSheet="background-color:sandybrown ;color:black")
+        self.btn_cancel_simulation.setFixedSize(160, 30)
+        self.btn_cancel_simulation.setEnabled(False)
+        self.btn_cancel_simulation.clicked.connect(self.worker.cancel)
         
         
         # Create Sliders with Labels and Input Fields
@@ -142,6 +160,7 @@ class EnergyModelApp(QWidget):
         sliders_layout.addWidget(self.input_demand)
         sliders_layout.addWidget(self.label_demand_value)  # Add label for displaying current value
         sliders_layout.addWidget(self.btn_run_simulation, alignment=QtCore.Qt.AlignCenter)
+        sliders_layout.addWidget(self.btn_cancel_simulation, alignment=QtCore.Qt.AlignCenter)
         
         
         # Now add sliders layout to the configure_parameters layout
@@ -205,19 +224,19 @@ class EnergyModelApp(QWidget):
         self.graphs_section.setStyleSheet("QGroupBox {color: white; font-size: 16px}")
         graphs_layout = QVBoxLayout(self.graphs_section)
         
-        # Now create a WebEngineView widget to display plotly graphs
-        self.grahics_view = QWebEngineView(self)
+        # Now create a WebEngineView widget to display plotly graphs; its page (with a local
+        # plotly.js) is loaded with the first results and only restyled for later ones
+        self.grahics_view = GaugeView(self)
     
-        # Add WebEngineView widget to groupbox layout of graphs section
-        graphs_layout.addWidget(self.grahics_view)
-        
-            
-        # Add plotly Figure axes
-        self.fig = make_subplots(rows=3, cols=1,   
-        specs=[[{"type": "indicator"}],
-           [{"type": "indicator"}],
-           [{"type": "indicator"}]],
-            vertical_spacing = 0.21)
+        # Zoomable hourly flows and state of charge, sent to the page downsampled
+        self.timeseries_view = TimeSeriesView(self)
+
+        # Add both views as tabs to groupbox layout of graphs section
+        self.graphs_tabs = QTabWidget(self)
+        self.graphs_tabs.addTab(self.grahics_view, 'KPIs')
+        self.graphs_tabs.addTab(self.timeseries_view, 'Time Series')
+        graphs_layout.addWidget(self.graphs_tabs)
+        
       
     
         ######################################################################################
@@ -336,10 +355,12 @@ class EnergyModelApp(QWidget):
         """
         Toggle function for the "Run Simulation" button.
 
-        If the button is checked (pressed), it attempts to execute the 
-        `run_simulation` method, updating the simulation results. If an 
-        exception occurs during the simulation,it logs the error, updates 
-        the button status, and displays an error message.
+        If the button is checked (pressed), it executes the `run_simulation`
+        method, which queues a scenario with the current slider values for the
+        background solver; the button is released again right away so that
+        further scenarios can be queued. If an exception occurs while queuing,
+        it logs the error, updates the button status, and displays an error
+        message.
 
         If the button is unchecked, it does nothing.
 
@@ -348,6 +369,7 @@ class EnergyModelApp(QWidget):
             None
         """
         if self.btn_run_simulation.isChecked():
+            self.btn_run_simulation.setChecked(False)
             try:
                 self.run_simulation()
             except Exception as e:
@@ -376,7 +398,9 @@ class EnergyModelApp(QWidget):
         6. Generate and display gauge plots representing PV production fed into the grid, 
         self-consumption, and self-sufficiency.
 
-        Note: The method also updates the GUI widgets with the simulation results.
+        Note: The optimisation runs in the background solver process of the
+        SimulationWorker; this method only queues the scenario. The GUI widgets
+        are updated by `show_results` once the result arrives.
 
         Returns:
         -------
@@ -385,121 +409,102 @@ class EnergyModelApp(QWidget):
         
         # Simulation Part
         #================#
+        from oemof.tools import logger
         logger.define_logging()
         logging.info('Simulation Started')
-        self.btn_run_simulation.setFixedSize(280, 30)
-        self.btn_run_simulation.setText('Simulation in Progress.....') # change status when simulation is running
-        QApplication.processEvents()
-        
-        # read input values from sliders
-        self.electricity_price = int(self.input_electricity_price.value())
-        self.feedin_price = int(self.input_feedin_price.value())
-        self.annual_demand = int(self.input_demand.value())
      
-        # create datetime index and read input files
-        logging.info("Initialize the energy system")
-        date_time_index = pd.date_range("1/1/2012", periods=8760, freq="h")
-        load_demand = pd.read_csv("Input_Files/Scaled_LP_H0.csv", usecols=['h0'])
-        PV_feed = pd.read_csv("Input_Files/Scaled_PV_Feed_in.csv", usecols=['DC_Power','AC_Power'] )
-
-        # Set Epc_Costs
-        epc_pv = economics.annuity(capex=int(self.input_PV_Capex.value()*100), n=25, wacc=0.03)
-        epc_storage = economics.annuity(capex=int(self.input_BESS_Capex.value()*100), n=10, wacc=0.03)
-        energysystem = solph.EnergySystem(timeindex=date_time_index, infer_last_interval = False)
-
-        bel = solph.buses.Bus(label="electricity")
-        
-        # Set PV System Capacity limit based on Feed-in Price
-        if self.feedin_price >= 8:
-            PV_Max_capacity = 10
-        elif self.feedin_price <= 7:
-            PV_Max_capacity = 30
-
-        # create fixed source object representing pv system
-        pv = solph.components.Source(
-            label="pv",
-            outputs={
-                bel: solph.Flow(
-                    fix=PV_feed['AC_Power'],  
-                    investment=solph.Investment(ep_costs=epc_pv, maximum = PV_Max_capacity)
-                )
-            },
-        )
-
-        # create simple sink object representing the electrical demand
-        demand = solph.components.Sink(
-            label="demand",
-            inputs={bel: solph.Flow(
-                fix=load_demand['h0'],
-                nominal_value=self.annual_demand,
-            )}
-        )
-
-        grid_supply = solph.components.Source(
-            label="grid_supply",
-            outputs={bel: solph.Flow(variable_costs=self.electricity_price / 100)}
-        )
-
-        grid_feed_in = solph.components.Sink(
-            label="grid_feed_in",
-            inputs={bel: solph.Flow(variable_costs=-self.feedin_price / 100)}
-        )
-
-        # create storage object representing a battery
-        storage = solph.components.GenericStorage(
-            label="storage",
-            inputs={bel: solph.Flow()},
-            outputs={bel: solph.Flow()},
-            balanced=True,
-            loss_rate= 0.005,
-            invest_relation_input_capacity=1/6,
-            invest_relation_output_capacity=1/6,
-            inflow_conversion_factor=1,
-            outflow_conversion_factor=1,
-            investment=solph.Investment(ep_costs=epc_storage),
+        # read input values from sliders
+        params = SizingParams(
+            mode=MODE_PV_BESS,
+            pv_capex=int(self.input_PV_Capex.value()*100),
+            bess_capex=int(self.input_BESS_Capex.value()*100),
+            electricity_price=int(self.input_electricity_price.value()),
+            feedin_price=int(self.input_feedin_price.value()),
+            annual_demand=int(self.input_demand.value())*1000,
         )
+        self.worker.submit(params)
+        self.pending_simulations += 1
+        self.btn_cancel_simulation.setEnabled(True)
+        self.show_stage(params, 'queued')
+
+    # Progress of the background simulation
+    #======================================#
+    def show_stage(self, params, stage):
+        """Show the stage of the running simulation and the number of queued ones on the button."""
+        queued = f' (+{self.pending_simulations - 1} queued)' if self.pending_simulations > 1 else ''
+        self.btn_run_simulation.setFixedSize(320, 30)
+        self.btn_run_simulation.setText(f'Simulation in Progress: {stage}{queued}.....') # change status when simulation is running
+
+    def finish_simulation(self):
+        """Reset the buttons once a scenario has finished, failed or was cancelled."""
+        self.pending_simulations = max(self.pending_simulations - 1, 0)
+        if self.pending_simulations == 0:
+            self.btn_cancel_simulation.setEnabled(False)
+
+    def show_failure(self, params, message):
+        """Report a failed simulation on the button."""
+        self.finish_simulation()
+        logging.error(f"Error during simulation: {message}")
+        self.btn_run_simulation.setFixedSize(320, 30)
+        self.btn_run_simulation.setText("Simulation Failed due to an error, Report Issue....")
+
+    def show_cancelled(self, params):
+        """Reset the button after a cancelled simulation."""
+        self.finish_simulation()
+        if self.pending_simulations == 0:
+            self.btn_run_simulation.setFixedSize(160, 30)
+            self.btn_run_simulation.setText("Run Simulation")
+
+    def closeEvent(self, event):
+        """Stop the background solver before the window closes."""
+        self.worker.stop()
+        cleanup_pages()
+        super().closeEvent(event)
+
+    def record_telemetry(self, event):
+        """Pass on a stage event of the solver process; later stages of the window belong to its run."""
+        if event.run is not None:
+            self.telemetry.run = event.run
+        self.telemetry.emit(event)
+
+    # Simulation results with plots
+    #=============================#
+    def show_results(self, params, result):
+        """
+        Update the GUI widgets with the results of a finished simulation.
 
-        energysystem.add(bel, pv, demand, grid_supply, grid_feed_in, storage)
-
-        # Optimise the energy system
-        logging.info("Optimise the energy system")
-        om = solph.Model(energysystem)
+        Parameters:
+        -----------
+            params: SizingParams
+                Input parameters of the simulated scenario.
+            result: SizingResult
+                Optimal capacities, energy balance and KPIs of the scenario.
 
-        # if tee_switch is true solver messages will be displayed
-        logging.info("Solve the optimization problem")
-        om.solve(solver="glpk", solve_kwargs={"tee": False})
-        
-        self.btn_run_simulation.setText('Simulation Finished, Updating Results.....') 
-        QApplication.processEvents()
-        
-        # check if the new result object is working for custom components
-        results = solph.processing.results(om)
-        electricity_bus = solph.views.node(results, "electricity")
-        
-        # Extract Optimal Capacity
-        my_results = electricity_bus["scalars"]
-        my_results["storage_invest_KWh"] = (results[(storage, None)]["scalars"]["invest"] )
+        Returns:
+        -------
+            None
+        """
+        self.finish_simulation()
+        self.result = result
+        # input values the scenario was run with
+        self.electricity_price = params.electricity_price
+        self.feedin_price = params.feedin_price
+        self.annual_demand = params.annual_demand/1000
        
         # Print Results
         print("********* Main results *********")
-        print(electricity_bus["sequences"].sum(axis=0))
-        pp.pprint(my_results)
-
-        # Rename sequences names 
-        nodes = electricity_bus["sequences"]
-        nodes.columns = ['demand','grid_feed_in', 'storage_in','grid_supply','Pv_feed_in','storage_out' ]
+        print(result.sequences.sum(axis=0))
+        pp.pprint(result.kpis())
         
         # Calculate Special Parameters
-        self_consumption = (nodes['Pv_feed_in'].sum() - nodes['grid_feed_in'].sum())/ nodes['Pv_feed_in'].sum()
-        self_sufficiency = (nodes['demand'].sum() - nodes['grid_supply'].sum())/ nodes['demand'].sum()
-        self.PV_capacity= round(results[(pv, bel)]["scalars"]["invest"],2)
-        self.storage_capacity =  round(my_results["storage_invest_KWh"],2)
-        Total_self_consumption = round(self_consumption * 100, 2)
-        Total_self_sufficiency = round(self_sufficiency * 100, 2)
-        self.Total_Pv_production = nodes['Pv_feed_in'].sum()
-        self.Grid_feed_in = nodes['grid_feed_in'].sum()
-        self.Grid_Import = nodes['grid_supply'].sum()
-        self.feed_in_percentage = (self.Grid_feed_in/ self.Total_Pv_production) * 100
+        self.PV_capacity = round(result.pv_capacity, 2)
+        self.storage_capacity = round(result.storage_capacity, 2)
+        Total_self_consumption = round(result.self_consumption, 2)
+        Total_self_sufficiency = round(result.self_sufficiency, 2)
+        self.Total_Pv_production = result.total_pv_production
+        self.Grid_feed_in = result.grid_feed_in
+        self.Grid_Import = result.grid_import
+        self.feed_in_percentage = result.feed_in_percentage
         self.Total_Demand = self.annual_demand*1000
         self.optimal_PV = f'{self.PV_capacity} KWp'
         self.optimal_Storage = f'{self.storage_capacity} KWh'
@@ -508,63 +513,20 @@ class EnergyModelApp(QWidget):
         # Plots Section
         #=============#
         
-        # To clear plots and entire layout in order to display updated/new graphs for every new simulation
-        self.fig.data = []
-        self.fig.layout = {}
-        
-         # 1. PV Production Fed into grid Gauge
-        self.fig.add_trace(go.Indicator(
-        value=self.feed_in_percentage,
-        mode="gauge+number",
-        title={'text': "<b>PV Production Fed into Grid (%)</b>"},
-        gauge={
-            'axis': {'range': [0, 100]},
-            'steps': [
-                {'range': [0, 30], 'color': "red"},
-                {'range': [30, 70], 'color': "yellow",},
-                {'range': [70, 100], 'color': "limegreen"}],
-            'bar': {'color': "silver"},
-            'threshold': {
-                'line': {'color': "red", 'width': 4},
-                'thickness': 0.75,
-                'value': self.feed_in_percentage}}),
-        row=1, col=1)
-        
-        # 2. Self Consumption Gauge
-        self.fig.add_trace(go.Indicator(
-        value=Total_self_consumption,
-        mode="gauge+number",
-        title={'text': "<b>Self Consumption (%)</b>"},
-        gauge={
-            'axis': {'range': [0, 100]},
-            'steps': [
-                {'range': [0, Total_self_consumption], 'color': "orange"},
-                {'range': [Total_self_consumption, 100], 'color': "white"}],
-            'bar': {'color': "orange"}}),
-        row=2, col=1)
-
-        # 3. Self Sufficiency Gauge
-        self.fig.add_trace(go.Indicator(
-            value=Total_self_sufficiency,
-            mode="gauge+number",
-            title={'text': "<b>Self Sufficiency (%)</b>"},
-            gauge={
-                'axis': {'range': [0, 100]},
-                'steps': [
-                    {'range': [0, Total_self_sufficiency], 'color': "yellowgreen"},
-                    {'range': [Total_self_sufficiency, 100], 'color': "white"}],
-                'bar': {'color': "yellowgreen"}}),
-            row=3, col=1)
+        # Gauges of PV fed into grid, self consumption and self sufficiency
+        with self.telemetry.stage('plot'):
+            self.grahics_view.set_kpis(self.feed_in_percentage, Total_self_consumption, Total_self_sufficiency)
+            self.timeseries_view.set_result(result)
 
         # Assign outputs to the Widgets
-        self.grahics_view.setHtml(self.fig.to_html(include_plotlyjs='cdn'))
         self.PV_output.setText(self.optimal_PV)
         self.Storage_output.setText(self.optimal_Storage)
         self.grahics_view.show()
-        self.btn_run_simulation.setFixedSize(160, 30)
-        self.btn_run_simulation.setText("Run Simulation")
-        self.btn_run_simulation.setCheckable(False)
-        self.btn_run_simulation.setCheckable(True)
+        if self.pending_simulations == 0:
+            self.btn_run_simulation.setFixedSize(160, 30)
+            self.btn_run_simulation.setText("Run Simulation")
+        with self.telemetry.stage('finance'):
+            self.update_costs()
 
 
     # Financial Analysis calculation 
@@ -591,32 +553,33 @@ class EnergyModelApp(QWidget):
         -------
             None
         """
-        
-
-        # Retrieve data from simulation results or input parameters
-        electricity_price = int(self.input_electricity_price.value())
-        feedin_price = int(self.input_feedin_price.value())
-        pv_capacity = self.PV_capacity
-        demand = int(self.Total_Demand)
-
-        # Retrieve other necessary data from the simulation results (if available)
-        pv_capex = int(self.input_PV_Capex.value()*100) # Example value, retrieve from model if available
-        bess_capex = int(self.input_BESS_Capex.value()*100)  # Example value, retrieve from model if available
-        bess_optimal_value = self.storage_capacity
-
-        # Perform financial calculations
+        if self.result is None:  # no simulation finished yet
+            return
+        from finance import analyse_results
+        # Prices and CAPEX of the scenario the result was computed for, not the current sliders
+        result = self.result
+        params = result.params
+        electricity_price = params.electricity_price
+        feedin_price = params.feedin_price
+        pv_capacity = round(result.pv_capacity, 2)
+        demand = int(params.annual_demand)
+        pv_capex = params.pv_capex
+        bess_capex = params.bess_capex
+
+        # Perform financial calculations; investment, savings and payback as in finance.py
+        finance = analyse_results([result])
         yearly_energy_costs_conventional = demand * electricity_price/100
-        total_pv_generated = self.Total_Pv_production  # Assuming 9411 kWh/kWp as in your previous calculation
-        fed_into_grid = self.Grid_feed_in  # Assuming all excess goes to grid
+        total_pv_generated = result.total_pv_production
+        fed_into_grid = result.grid_feed_in
         income_from_fit = fed_into_grid  * feedin_price/100
-        energy_bill_grid_import = self.Grid_Import * electricity_price/100
-        pv_investment = pv_capacity * pv_capex
-        bess_investment = bess_optimal_value * bess_capex
-        total_investments = pv_investment + bess_investment
+        energy_bill_grid_import = result.grid_import * electricity_price/100
+        pv_investment = result.pv_capacity * pv_capex
+        bess_investment = result.storage_capacity * bess_capex
+        total_investments = float(finance.investment[0])
 
         # Calculate cost savings and payback period
-        cost_savings = yearly_energy_costs_conventional - energy_bill_grid_import + income_from_fit
-        payback_period = total_investments / cost_savings
+        cost_savings = float(finance.annual_savings[0])
+        payback_period = float(finance.simple_payback[0])
         Disclaimer_text = "Disclaimer:   Results and analysis are jsut estimations and may vary in real-world scenarios"
         
         data = [
@@ -630,7 +593,7 @@ class EnergyModelApp(QWidget):
         ("Total PV Generated", f"{total_pv_generated:.2f} kWh"),
         ("Fed-into-Grid", f"{fed_into_grid:.2f} kWh"),
         ("Income from FiT", f"{income_from_fit:.2f} €"),
-        ("Grid Import", f"{self.Grid_Import:.2f} kWh"),
+        ("Grid Import", f"{result.grid_import:.2f} kWh"),
         ("Energy bill for Grid Import", f"{energy_bill_grid_import:.2f} €/Yr"),
         ("Investment Costs", ""),  # Separator
         ("PV-CAPEX", f"{pv_capex} €/kWp"),
@@ -695,6 +658,7 @@ def main():
     main_window = EnergyModelApp()
     main_window.init_ui()
     main_window.show()
+    report_startup(app)
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
@@ -0,0 +1,212 @@
+"""
+Aggregation Module
+
+This module provides the reduced "typical days" solve mode of the sizing engine.
+The days of the year are clustered on their load and PV profiles, and the model is
+solved only for one representative day per cluster, weighted by the number of days
+it stands for. This trades some accuracy for an order of magnitude shorter solves,
+which is useful for screening sweeps.
+
+The module contains the following components:
+- TypicalDays: Representative days, their weights and the day-to-cluster assignment.
+- cluster_days: k-means clustering of the days into k typical days.
+- link_storage_daily: Storage-state linking constraints of the reduced model.
+- validate / error_bound: Error of reduced solutions against the full-year solutions.
+
+Usage:
+1. Create the engine with SizingEngine(typical_days=k) to size cases on k typical days.
+2. Call error_bound(engine, sample_of_params) on a few cases to measure the error
+   for the chosen k before relying on it in a sweep.
+
+"""
+
+
+from dataclasses import dataclass
+import numpy as np
+import pyomo.environ as po
+
+
+HOURS_PER_DAY = 24
+
+
+@dataclass
+class TypicalDays:
+    """
+    Result of the day clustering.
+
+    `days` holds the index of the representative (medoid) day of every cluster,
+    `weights` the number of days in the cluster and `assignment` the cluster of
+    every day of the year. `profile_rmse` is the root mean square deviation of the
+    normalised profiles from their representatives, a measure of the information
+    lost by the aggregation.
+    """
+    days: np.ndarray
+    weights: np.ndarray
+    assignment: np.ndarray
+    profile_rmse: float
+
+    @property
+    def k(self):
+        return len(self.days)
+
+    def hours(self):
+        """Return the indices of the hours of the representative days, in cluster order."""
+        return (self.days[:, None] * HOURS_PER_DAY + np.arange(HOURS_PER_DAY)).ravel()
+
+    def hour_weights(self):
+        """Return the weight of every hour of the reduced time series."""
+        return np.repeat(self.weights, HOURS_PER_DAY).astype(float)
+
+
+def cluster_days(load_profile, pv_profile, k, seed=0, max_iter=100):
+    """
+    Cluster the days of the year into k typical days.
+
+    Both profiles are normalised to their maximum, so that load and PV shape
+    weigh equally, and clustered with k-means (k-means++ initialisation). Every
+    cluster is represented by its medoid, the real day closest to the cluster
+    centre, so the representative profiles are consistent with each other.
+
+    Parameters:
+    -----------
+        load_profile, pv_profile: array-like
+            Hourly profiles with a whole number of days.
+        k: int
+            Number of typical days.
+        seed: int
+            Seed of the initialisation, the clustering is deterministic for a seed.
+
+    Returns:
+    --------
+        TypicalDays
+    """
+    load = np.asarray(load_profile, dtype=float)
+    pv = np.asarray(pv_profile, dtype=float)
+    if len(load) % HOURS_PER_DAY or len(load) != len(pv):
+        raise ValueError("Typical days need hourly load and PV profiles of whole days and equal length")
+    n_days = len(load) // HOURS_PER_DAY
+    if not 1 <= k <= n_days:
+        raise ValueError(f"Number of typical days must be between 1 and {n_days}, got {k}")
+
+    features = np.hstack([
+        load.reshape(n_days, HOURS_PER_DAY) / (load.max() or 1),
+        pv.reshape(n_days, HOURS_PER_DAY) / (pv.max() or 1),
+    ])
+
+    # k-means++ initialisation
+    rng = np.random.RandomState(seed)
+    centres = [features[rng.randint(n_days)]]
+    for _ in range(1, k):
+        distance = np.min([((features - c) ** 2).sum(axis=1) for c in centres], axis=0)
+        total = distance.sum()
+        probabilities = distance / total if total else np.full(n_days, 1 / n_days)
+        centres.append(features[rng.choice(n_days, p=probabilities)])
+    centres = np.array(centres)
+
+    assignment = np.full(n_days, -1)
+    for _ in range(max_iter):
+        distance = ((features[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        new_assignment = distance.argmin(axis=1)
+        if np.array_equal(new_assignment, assignment):
+            break
+        assignment = new_assignment
+        for cluster in range(k):
+            members = features[assignment == cluster]
+            if len(members):
+                centres[cluster] = members.mean(axis=0)
+
+    # Drop empty clusters and represent every cluster by its medoid
+    days, weights, labels = [], [], np.empty(n_days, dtype=int)
+    for cluster in range(k):
+        members = np.flatnonzero(assignment == cluster)
+        if not len(members):
+            continue
+        spread = ((features[members] - centres[cluster]) ** 2).sum(axis=1)
+        labels[members] = len(days)
+        days.append(members[spread.argmin()])
+        weights.append(len(members))
+    days = np.array(days)
+
+    rmse = float(np.sqrt(((features - features[days][labels]) ** 2).mean()))
+    return TypicalDays(days=days, weights=np.array(weights), assignment=labels, profile_rmse=rmse)
+
+
+def link_storage_daily(om, storage, n_days):
+    """
+    Link the storage state of the reduced model day by day.
+
+    The representative days are not consecutive, so energy must not be shifted
+    from one of them into the next. Every representative day therefore ends
+    with the storage content it started with, which matches the daily cycling
+    of household batteries.
+    """
+    block = om.GenericInvestmentStorageBlock
+
+    # storage_content[n, t] is the content at the end of timestep t, init_content the one before the first
+    def start_content(d):
+        return block.init_content[storage] if d == 0 else block.storage_content[storage, d * HOURS_PER_DAY - 1]
+
+    om.ecosizer_daily_storage_link = po.Constraint(
+        range(n_days),
+        rule=lambda m, d: start_content(d) == block.storage_content[storage, (d + 1) * HOURS_PER_DAY - 1])
+
+
+def _check_typical_days(engine):
+    if not engine.typical_days or engine.aggregation is None:
+        raise ValueError("The error of typical days needs an engine created with typical_days=k")
+
+
+def validate(engine, params):
+    """
+    Compare the typical-days solution of a case with its full-year solution.
+
+    Returns:
+    --------
+        dict
+            Absolute and relative errors of the PV and storage capacity and the
+            absolute error of self sufficiency in %-points, plus both results.
+
+    Raises:
+    -------
+        ValueError
+            If the engine does not size on typical days.
+    """
+    _check_typical_days(engine)
+    reduced = engine.size(params)
+    full = engine.size(params, typical_days=0)
+
+    def relative(a, b):
+        return abs(a - b) / abs(b) if b else (0.0 if a == b else float('inf'))
+
+    return {
+        'typical_days': engine.typical_days,
+        'profile_rmse': engine.aggregation.profile_rmse,
+        'pv_capacity_error': abs(reduced.pv_capacity - full.pv_capacity),
+        'pv_capacity_relative_error': relative(reduced.pv_capacity, full.pv_capacity),
+        'storage_capacity_error': abs(reduced.storage_capacity - full.storage_capacity),
+        'storage_capacity_relative_error': relative(reduced.storage_capacity, full.storage_capacity),
+        'self_sufficiency_error': abs(reduced.self_sufficiency - full.self_sufficiency),
+        'reduced': reduced,
+        'full': full,
+    }
+
+
+def error_bound(engine, params_iterable):
+    """
+    Return the largest errors of the typical-days solutions over a sample of cases.
+
+    The maxima over a representative sample serve as the error bound of the
+    reduced mode for the chosen number of typical days. Raises a ValueError if
+    the engine does not size on typical days.
+    """
+    _check_typical_days(engine)
+    keys = ['pv_capacity_error', 'pv_capacity_relative_error', 'storage_capacity_error',
+            'storage_capacity_relative_error', 'self_sufficiency_error']
+    bound = dict.fromkeys(keys, 0.0)
+    for params in params_iterable:
+        errors = validate(engine, params)
+        for key in keys:
+            bound[key] = max(bound[key], errors[key])
+    bound['typical_days'] = engine.typical_days
+    bound['profile_rmse'] = engine.aggregation.profile_rmse
+    return bound
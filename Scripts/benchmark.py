@@ -0,0 +1,272 @@
+"""
+Benchmark Module
+
+This module measures how long the stages of a sizing run take: reading the
+profile CSV files, building the solph model, solving it, solph.processing.results,
+mapping the bus flows with the result schema and the charts of the GUIs: writing
+the gauge and time-series pages of a first result with chart_figures.py ('plot') and
+the restyle updates of a following one ('plot_update'). The PV+BESS and
+storage-only scenarios are run headlessly over a matrix of time resolutions and
+horizons (hourly, quarter-hourly, multi-year) and solvers. Every case runs in a
+fresh process, so its peak memory is measured on its own. The chart stages are
+skipped where plotly is not installed.
+
+The results are written as JSON and can be compared against a stored baseline;
+any stage that became slower than the baseline by more than the tolerance makes
+the run fail with exit code 1. Cases and stages without a counterpart in the
+baseline are listed, and a run that matches nothing of the baseline fails too.
+
+Usage:
+    python benchmark.py --output bench.json --save-baseline benchmark_baseline.json
+    python benchmark.py --solvers highs --output bench.json --baseline benchmark_baseline.json
+
+"""
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import itertools
+import multiprocessing
+import numpy as np
+import pandas as pd
+from telemetry import rss_mb, peak_rss_mb
+
+
+# Time resolutions and horizons of the benchmark matrix: (steps per hour, years)
+SIZES = {
+    'hourly': (1, 1),            # 8760 steps
+    'quarter-hourly': (4, 1),    # 35040 steps
+    'multi-year': (1, 3),        # 26280 steps
+}
+SCENARIOS = ('pv-bess', 'bess')
+STAGES = ('csv_read', 'build', 'solve', 'results', 'bus_flows', 'plot', 'plot_update')
+# Chart width (px) the time series is downsampled for, TimeSeriesView.DEFAULT_WIDTH
+CHART_WIDTH = 1000
+
+
+def scale_profile(profile, steps_per_hour, years):
+    """
+    Return an hourly power profile at a finer resolution and over several years.
+
+    Hourly values are average powers, so each is repeated for every sub-hourly
+    step; the year is repeated for multi-year horizons.
+    """
+    return np.tile(np.repeat(np.asarray(profile, dtype=float), steps_per_hour), years)
+
+
+def _show_charts(result, directory):
+    """Write the gauge and time-series pages of a first result, like GaugeView and TimeSeriesView do."""
+    from chart_figures import gauge_figure, time_series_lod, time_series_figure, write_page
+    write_page(gauge_figure(result.feed_in_percentage, result.self_consumption, result.self_sufficiency),
+               os.path.join(directory, "gauges.html"))
+    lod = time_series_lod(result)
+    write_page(time_series_figure(lod.window(points=2 * CHART_WIDTH)), os.path.join(directory, "timeseries.html"))
+
+
+def _update_charts(result):
+    """Return the restyle scripts sent to the loaded pages for a following result."""
+    from chart_figures import gauge_update, time_series_lod, time_series_update
+    lod = time_series_lod(result)
+    return (json.dumps(gauge_update(result.feed_in_percentage, result.self_consumption, result.self_sufficiency)),
+            json.dumps(time_series_update(lod.window(points=2 * CHART_WIDTH))))
+
+
+def run_case(scenario, size, solver):
+    """
+    Run one benchmark case and return its stage timings and memory use.
+
+    Meant to be run in a fresh process (see run_matrix).
+    """
+    from oemof import solph
+    from sizing_engine import (SizingEngine, SizingParams, INPUT_DIR, LOAD_PROFILE_FILE, PV_PROFILE_FILE,
+                               MODE_PV_BESS, MODE_BESS)
+    from result_schema import flows_from_results
+
+    steps_per_hour, years = SIZES[size]
+    timings, rss = {}, {}
+
+    def stage(name, start):
+        timings[name] = time.perf_counter() - start
+        rss[name] = rss_mb()
+
+    start = time.perf_counter()
+    load = pd.read_csv(os.path.join(INPUT_DIR, LOAD_PROFILE_FILE), usecols=['h0'])['h0']
+    pv = pd.read_csv(os.path.join(INPUT_DIR, PV_PROFILE_FILE), usecols=['AC_Power'])['AC_Power']
+    stage('csv_read', start)
+
+    engine = SizingEngine(solver=solver)
+    load = pd.Series(scale_profile(load, steps_per_hour, years))
+    pv = pd.Series(scale_profile(pv, steps_per_hour, years))
+    # solph models the intervals between the points of the time index
+    timeindex = pd.date_range("1/1/2012", periods=len(load) + 1, freq=pd.Timedelta(hours=1 / steps_per_hour))
+    if scenario == 'pv-bess':
+        params = SizingParams(mode=MODE_PV_BESS)
+    else:
+        params = SizingParams(mode=MODE_BESS, pv_capacity=8)
+
+    start = time.perf_counter()
+    om, components = engine.build_model(params, load_profile=load, pv_profile=pv, timeindex=timeindex)
+    stage('build', start)
+
+    start = time.perf_counter()
+    engine.solve_model(om)
+    stage('solve', start)
+
+    start = time.perf_counter()
+    results = solph.processing.results(om)
+    stage('results', start)
+
+    start = time.perf_counter()
+    flows_from_results(results, len(om.TIMESTEPS)).to_frame()
+    stage('bus_flows', start)
+
+    result = engine.process_results(params, om, components)
+    directory = tempfile.mkdtemp(prefix="ecosizer-bench-")
+    try:
+        start = time.perf_counter()
+        _show_charts(result, directory)
+        stage('plot', start)
+        start = time.perf_counter()
+        _update_charts(result)
+        stage('plot_update', start)
+    except ImportError:  # plotly is only needed by the GUIs
+        pass
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'scenario': scenario,
+        'size': size,
+        'solver': engine.solver_backend.backend,
+        'requested_solver': solver,
+        'timesteps': len(timeindex) - 1,
+        'stages': timings,
+        'rss_mb': rss,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _run_case_star(args):
+    return run_case(*args)
+
+
+def run_matrix(scenarios=SCENARIOS, sizes=tuple(SIZES), solvers=("glpk",), repeat=1):
+    """
+    Run every combination of scenario, size and solver in a fresh process.
+
+    With repeat > 1 every case is run several times and the fastest time of
+    each stage is kept, which reduces noise from other load on the machine.
+    """
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    for case in itertools.product(scenarios, sizes, solvers):
+        runs = []
+        for _ in range(repeat):
+            with context.Pool(1) as pool:  # one process per run for a clean peak RSS
+                runs.append(pool.apply(_run_case_star, (case,)))
+        best = runs[0]
+        for run in runs[1:]:
+            for name, seconds in run['stages'].items():
+                best['stages'][name] = min(best['stages'].get(name, seconds), seconds)
+        best['peak_rss_mb'] = max((run['peak_rss_mb'] or 0) for run in runs) or None
+        cases.append(best)
+        print(f"{case}: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in best['stages'].items()))
+    return cases
+
+
+def _case_key(case):
+    return f"{case['scenario']}|{case['size']}|{case['requested_solver']}"
+
+
+def compare(cases, baseline, tolerance=0.25, min_seconds=0.05):
+    """
+    Compare benchmark cases against a baseline.
+
+    A stage counts as regression if it is slower than in the baseline by more
+    than `tolerance` (relative) and by more than `min_seconds` (absolute), so
+    that noise in very short stages does not fail the run.
+
+    Returns:
+    --------
+        regressions: list of str
+            One message per regression; empty if there is none.
+        unmatched: list of str
+            Cases and stages of the run missing from the baseline, and stages
+            of the baseline missing from the run, which were not compared.
+        compared: int
+            Number of stages compared.
+    """
+    reference = {_case_key(case): case for case in baseline['cases']}
+    regressions, unmatched = [], []
+    compared = 0
+    for case in cases:
+        key = _case_key(case)
+        base = reference.get(key)
+        if base is None:
+            unmatched.append(f"{key}: case not in the baseline")
+            continue
+        for name, seconds in case['stages'].items():
+            before = base['stages'].get(name)
+            if before is None:
+                unmatched.append(f"{key} {name}: stage not in the baseline")
+                continue
+            compared += 1
+            if seconds > before * (1 + tolerance) and seconds - before > min_seconds:
+                regressions.append(f"{key} {name}: {seconds:.3f}s vs. baseline {before:.3f}s")
+        unmatched += [f"{key} {name}: stage of the baseline not run" for name in base['stages']
+                      if name not in case['stages']]
+    return regressions, unmatched, compared
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stages of EcoSizer sizing runs.")
+    parser.add_argument("--output", default="bench_output.json", help="JSON file for the results")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--solvers", nargs="+", default=["glpk"], help="solvers to benchmark, e.g. glpk cbc highs")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest is kept")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown per stage")
+    parser.add_argument("--save-baseline", help="also write the results to this baseline file")
+    args = parser.parse_args(argv)
+
+    from oemof.solph import __version__ as solph_version
+    report = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'oemof.solph': solph_version,
+            'cpu_count': os.cpu_count(),
+        },
+        'cases': run_matrix(args.scenarios, args.sizes, args.solvers, args.repeat),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions, unmatched, compared = compare(report['cases'], json.load(f), args.tolerance)
+        if unmatched:
+            print("Not compared:\n  " + "\n  ".join(unmatched))
+        if not compared:
+            print(f"Nothing of this run is in the baseline {args.baseline}; check --solvers and --sizes.")
+            return 1
+        if regressions:
+            print("Performance regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print(f"No performance regressions in {compared} stages compared against the baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
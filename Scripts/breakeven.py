@@ -0,0 +1,217 @@
+"""
+Break-even Module
+
+This module traces the optimal PV and storage capacity of a household as a
+function of one input, e.g. "at which BESS CAPEX does the optimal storage go to
+zero?", with as few solves as possible instead of a brute-force grid.
+
+The search uses the structure of the LP: a CAPEX only scales the objective
+coefficient of its own capacity, so the optimal capacities are piecewise
+constant in it, and if the same capacities are optimal at both ends of an
+interval they are optimal on the whole interval. Intervals are therefore only
+split where the capacities differ by more than the requested resolution, and
+jumps are located within the tolerance. Energy prices and the WACC give no such
+guarantee (the feed-in tariff also sets the PV size limit and the WACC moves
+both annuities at once), and inputs on the constraint side (annual demand,
+existing PV size) give piecewise linear capacities; for all of these an interval
+is accepted when its midpoint lies on the straight line between its ends, which
+for equal ends means the capacities at the midpoint agree. The optimal capacity
+never grows with its own CAPEX, so its break-even is found by plain bisection.
+All solves run on one PersistentModel, which the HiGHS backend re-solves from
+the previous basis.
+
+The module contains the following components:
+- BreakEvenCurve: Solved points and breakpoints of a traced input.
+- trace: Trace the capacities over an interval of one input.
+- break_even: The CAPEX above which the PV or storage capacity is zero.
+
+Usage:
+1. Create a SizingEngine and the SizingParams of the household.
+2. Call trace(engine, params, "bess_capex", 300, 1500) or
+   break_even(engine, params, "storage", 300, 1500).
+
+"""
+
+
+import logging
+from dataclasses import dataclass, replace
+import pandas as pd
+from sizing_engine import PersistentModel, MODE_PV_BESS
+
+
+# Inputs that only scale the objective coefficient of one capacity: capacities are piecewise constant in them
+COST_PARAMETERS = ('pv_capex', 'bess_capex')
+# Prices and WACC: not exactly constant between equal ends, checked at the midpoint
+PRICE_PARAMETERS = ('electricity_price', 'feedin_price', 'wacc')
+# Inputs on the right-hand side of constraints: capacities are piecewise linear in them
+RHS_PARAMETERS = ('annual_demand', 'pv_capacity')
+PARAMETERS = COST_PARAMETERS + PRICE_PARAMETERS + RHS_PARAMETERS
+# CAPEX searched by break_even for each capacity
+CAPEX_OF = {'storage': 'bess_capex', 'pv': 'pv_capex'}
+
+
+@dataclass
+class BreakEvenCurve:
+    """
+    Optimal capacities as piecewise function of one input.
+
+    `points` holds every solved value of the input with the PV (kWp) and storage
+    (kWh) capacity, sorted by value; between neighbouring points the capacities
+    change by at most the resolution of the trace, or linearly for inputs other
+    than a CAPEX. `breakpoints` lists the jumps larger than the resolution,
+    each with the value (middle of the final bracket, which is narrower than the
+    tolerance) and the capacities just below and above it.
+    """
+    parameter: str
+    points: pd.DataFrame
+    breakpoints: list
+    solves: int
+
+
+def _capacities(model):
+    storage = sum(var.value for var in model.storage_invest)
+    pv = sum(var.value for var in model.pv_invest) if model.mode == MODE_PV_BESS else None
+    return pv, storage
+
+
+class _Solver:
+    """Solves one household for values of one input on a single PersistentModel."""
+
+    def __init__(self, engine, params, parameter, low, max_solves):
+        if parameter not in PARAMETERS:
+            raise ValueError(f"Cannot trace {parameter!r}, expected one of {PARAMETERS}")
+        if parameter == 'pv_capacity' and params.mode == MODE_PV_BESS:
+            raise ValueError("pv_capacity is only an input in 'bess' mode")
+        self.engine = engine
+        self.params = params
+        self.parameter = parameter
+        self.max_solves = max_solves
+        self.model = PersistentModel(engine, replace(params, **{parameter: low}))
+        self.solved = {}
+
+    def __call__(self, value):
+        if value not in self.solved:
+            if len(self.solved) >= self.max_solves:
+                raise RuntimeError(f"Tracing {self.parameter} needs more than {self.max_solves} solves")
+            self.engine.solve_model(self.model.update(replace(self.params, **{self.parameter: value})))
+            self.solved[value] = _capacities(self.model)
+        return self.solved[value]
+
+
+def _close(a, b, tolerance):
+    return all(x is None or abs(x - y) <= tolerance for x, y in zip(a, b))
+
+
+def trace(engine, params, parameter, low, high, tolerance=None, resolution=0.1, max_solves=200):
+    """
+    Trace the optimal capacities over an interval of one input.
+
+    Parameters:
+    -----------
+        engine: SizingEngine
+            Engine providing profiles and solver.
+        params: SizingParams
+            The household; `parameter` is varied, all other inputs are kept.
+        parameter: str
+            One of COST_PARAMETERS, PRICE_PARAMETERS or RHS_PARAMETERS.
+        low, high: float
+            Interval of the input.
+        tolerance: float
+            Width to which breakpoints are located; 1/1000 of the interval by default.
+        resolution: float
+            Largest change of a capacity (kWp, kWh) between neighbouring points.
+        max_solves: int
+            Upper bound on the number of solves.
+
+    Returns:
+    --------
+        BreakEvenCurve
+    """
+    tolerance = tolerance or (high - low) / 1000
+    solve = _Solver(engine, params, parameter, low, max_solves)
+
+    def linear(a, b, mid):
+        left, right = solve(a), solve(b)
+        weight = (mid - a) / (b - a)
+        expected = tuple(None if l is None else l + weight * (r - l) for l, r in zip(left, right))
+        return _close(expected, solve(mid), resolution)
+
+    breakpoints = []
+    stack = [(low, high)]
+    while stack:
+        a, b = stack.pop()
+        left, right = solve(a), solve(b)
+        if parameter in COST_PARAMETERS and _close(left, right, resolution):
+            continue  # constant (or within the resolution) on the whole interval
+        if b - a <= tolerance:
+            if not _close(left, right, resolution):
+                breakpoints.append({'value': (a + b) / 2, 'pv_before': left[0], 'pv_after': right[0],
+                                    'storage_before': left[1], 'storage_after': right[1]})
+            continue
+        mid = (a + b) / 2
+        if parameter not in COST_PARAMETERS and linear(a, b, mid):
+            continue  # one linear (or constant) piece
+        stack += [(mid, b), (a, mid)]
+
+    logging.info(f"Traced {parameter} over [{low}, {high}] with {len(solve.solved)} solves, "
+                 f"{len(breakpoints)} breakpoints")
+    points = pd.DataFrame([(value, pv, storage) for value, (pv, storage) in sorted(solve.solved.items())],
+                          columns=[parameter, 'pv_capacity', 'storage_capacity'])
+    return BreakEvenCurve(parameter=parameter, points=points,
+                          breakpoints=sorted(breakpoints, key=lambda point: point['value']),
+                          solves=len(solve.solved))
+
+
+def break_even(engine, params, capacity='storage', low=300, high=1500, tolerance=1, zero=1e-3, max_solves=50):
+    """
+    Return the CAPEX above which the optimal PV or storage capacity is zero.
+
+    The optimal capacity does not grow with its own CAPEX, so the break-even is
+    bracketed by bisection in about log2((high - low) / tolerance) solves.
+
+    Parameters:
+    -----------
+        capacity: str
+            "storage" (searches bess_capex) or "pv" (searches pv_capex).
+        low, high: float
+            Search interval of the CAPEX (€/kWh or €/kWp).
+        tolerance: float
+            Width of the final bracket.
+        zero: float
+            Capacities up to this value count as zero.
+
+    Returns:
+    --------
+        float
+            Middle of the final bracket; `low` if the capacity is already zero
+            there, None if it is still built at `high`.
+
+    Raises:
+    -------
+        ValueError
+            For an unknown `capacity`, or "pv" outside of 'pv-bess' mode, where
+            the PV capacity is an input.
+    """
+    if capacity not in CAPEX_OF:
+        raise ValueError(f"Unknown capacity {capacity!r}, expected one of {tuple(CAPEX_OF)}")
+    if capacity == 'pv' and params.mode != MODE_PV_BESS:
+        raise ValueError("PV break-even needs 'pv-bess' mode")
+    parameter = CAPEX_OF[capacity]
+    position = 1 if capacity == 'storage' else 0
+    solve = _Solver(engine, params, parameter, low, max_solves)
+
+    def built(value):
+        return solve(value)[position] > zero
+
+    if not built(low):
+        return low
+    if built(high):
+        return None
+    while high - low > tolerance:
+        mid = (low + high) / 2
+        if built(mid):
+            low = mid
+        else:
+            high = mid
+    logging.info(f"Break-even {parameter} found with {len(solve.solved)} solves")
+    return (low + high) / 2
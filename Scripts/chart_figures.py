@@ -0,0 +1,144 @@
+"""
+Chart Figures Module
+
+This module builds the plotly figures of the EcoSizer GUIs and the Plotly.restyle
+updates that later results are pushed into a loaded chart page with. It needs
+plotly and numpy but no Qt, so the figures can be built and timed headlessly
+(see benchmark.py); charts.py shows them in the web views of the GUIs.
+
+The module contains the following components:
+- write_page: Write a figure as local page next to the bundled plotly.js.
+- gauge_figure / gauge_update: Figure and restyle update of the KPI gauges.
+- TIME_SERIES_TRACES: Series, legend names and rows of the time-series view.
+- time_series_lod / time_series_figure / time_series_update: Level of detail,
+  figure and restyle update of the time-series view.
+
+Usage:
+1. Build a figure, e.g. gauge_figure(feed_in, self_consumption, self_sufficiency),
+   and write it with write_page(figure, path).
+2. Send gauge_update(...) or time_series_update(window) of later results to the
+   loaded page with Plotly.restyle.
+
+"""
+
+
+import numpy as np
+from downsample import SeriesLevelOfDetail
+
+
+def write_page(figure, path):
+    """Write a figure as local chart page and return its path."""
+    # 'directory' writes plotly.min.js next to the page once and references it relatively
+    figure.write_html(path, include_plotlyjs='directory', full_html=True,
+                      config={'displaylogo': False, 'responsive': True})
+    return path
+
+
+# KPI gauges
+#===========#
+def _gauge_styles(feed_in, self_consumption, self_sufficiency):
+    """Return the value-dependent gauge attributes of the three gauges."""
+    return [
+        {
+            'axis': {'range': [0, 100]},
+            'steps': [
+                {'range': [0, 30], 'color': "red"},
+                {'range': [30, 70], 'color': "yellow"},
+                {'range': [70, 100], 'color': "limegreen"}],
+            'bar': {'color': "silver"},
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': feed_in}},
+        {
+            'axis': {'range': [0, 100]},
+            'steps': [
+                {'range': [0, self_consumption], 'color': "orange"},
+                {'range': [self_consumption, 100], 'color': "white"}],
+            'bar': {'color': "orange"}},
+        {
+            'axis': {'range': [0, 100]},
+            'steps': [
+                {'range': [0, self_sufficiency], 'color': "yellowgreen"},
+                {'range': [self_sufficiency, 100], 'color': "white"}],
+            'bar': {'color': "yellowgreen"}},
+    ]
+
+
+GAUGE_TITLES = ("<b>PV Production Fed into Grid (%)</b>", "<b>Self Consumption (%)</b>",
+                "<b>Self Sufficiency (%)</b>")
+
+
+def gauge_figure(feed_in, self_consumption, self_sufficiency):
+    """Return the plotly figure of the PV feed-in, self-consumption and self-sufficiency gauges."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    fig = make_subplots(rows=3, cols=1,
+                        specs=[[{"type": "indicator"}], [{"type": "indicator"}], [{"type": "indicator"}]],
+                        vertical_spacing=0.21)
+    values = (feed_in, self_consumption, self_sufficiency)
+    for row, (value, title, gauge) in enumerate(zip(values, GAUGE_TITLES, _gauge_styles(*values)), 1):
+        fig.add_trace(go.Indicator(value=value, mode="gauge+number", title={'text': title}, gauge=gauge),
+                      row=row, col=1)
+    return fig
+
+
+def gauge_update(feed_in, self_consumption, self_sufficiency):
+    """Return the Plotly.restyle update of the three gauges, one array element per trace."""
+    styles = _gauge_styles(feed_in, self_consumption, self_sufficiency)
+    return {
+        'value': [feed_in, self_consumption, self_sufficiency],
+        'gauge.steps': [style['steps'] for style in styles],
+    }
+
+
+# Time series
+#============#
+# Traces of the time-series view: (series, legend name, row); SoC in the second row
+TIME_SERIES_TRACES = (
+    ('demand', "Demand", 1),
+    ('Pv_feed_in', "PV production", 1),
+    ('grid_supply', "Grid import", 1),
+    ('grid_feed_in', "Grid feed-in", 1),
+    ('storage_in', "Storage charge", 1),
+    ('storage_out', "Storage discharge", 1),
+    ('storage_content', "State of charge", 2),
+)
+
+
+def time_axis(index):
+    """Return the time axis of result sequences in epoch milliseconds, as used by plotly date axes."""
+    if hasattr(index, 'asi8'):
+        return index.asi8 / 1e6
+    return np.arange(len(index)) * 3.6e6  # no timestamps: hours from the epoch
+
+
+def time_series_lod(result):
+    """Return the level of detail of the flows and state of charge of a SizingResult."""
+    sequences = result.sequences
+    series = {name: sequences[name].to_numpy() for name, _, row in TIME_SERIES_TRACES if row == 1}
+    content = result.storage_content
+    series['storage_content'] = np.zeros(len(sequences)) if content is None else content
+    return SeriesLevelOfDetail(time_axis(sequences.index), series)
+
+
+def time_series_figure(window):
+    """Return the figure of the flows (kW) and state of charge (kWh) from a downsampled window."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.65, 0.35], vertical_spacing=0.06)
+    for name, title, row in TIME_SERIES_TRACES:
+        x, y = window[name]
+        fig.add_trace(go.Scattergl(x=x, y=y, name=title, mode='lines', line={'width': 1}), row=row, col=1)
+    fig.update_xaxes(type='date')
+    fig.update_yaxes(title_text="Power (kW)", row=1, col=1)
+    fig.update_yaxes(title_text="Storage (kWh)", row=2, col=1)
+    fig.update_layout(margin={'l': 60, 'r': 20, 't': 30, 'b': 30}, legend={'orientation': 'h', 'y': 1.08},
+                      hovermode='x unified')
+    return fig
+
+
+def time_series_update(window):
+    """Return the Plotly.restyle update of all traces from a downsampled window."""
+    traces = [window[name] for name, _, _ in TIME_SERIES_TRACES]
+    return {'x': [x.tolist() for x, _ in traces], 'y': [y.tolist() for _, y in traces]}
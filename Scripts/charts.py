@@ -0,0 +1,229 @@
+"""
+Charts Module
+
+This module renders the plotly charts of the EcoSizer GUIs in a QWebEngineView
+without network access and without reloading the page for every simulation.
+The page of a chart is loaded once, with the plotly.js bundled in the plotly
+package written next to it; the results of later simulations are pushed into
+the loaded page with Plotly.restyle, so only the new values cross into the web
+view.
+
+The time-series view of the flows around the electricity bus and the storage
+state of charge only sends downsampled points (see downsample.py). When the user
+zooms, the page reports the visible range through a QWebChannel and the points
+of that window are sent at the resolution of the chart width. The figures and
+updates themselves are built by chart_figures.py, which does not need Qt.
+
+The module contains the following components:
+- ChartView: QWebEngineView showing one plotly figure from a local page.
+- GaugeView: The three KPI gauges of the Energy Distribution Overview.
+- TimeSeriesView: Zoomable flows and state of charge with level-of-detail updates.
+
+Usage:
+1. Add a GaugeView to the window layout instead of a plain QWebEngineView.
+2. Call set_kpis(feed_in, self_consumption, self_sufficiency) with every result.
+3. Call set_result(result) of a TimeSeriesView with every SizingResult.
+
+"""
+
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+from PyQt5 import QtCore
+from PyQt5.QtWebChannel import QWebChannel
+from PyQt5.QtWebEngineWidgets import QWebEngineView
+from chart_figures import (write_page, gauge_figure, gauge_update, TIME_SERIES_TRACES, time_series_lod,
+                           time_series_figure, time_series_update)
+
+
+# Chart pages and the shared plotly.js are written here once per process
+_PAGE_DIR = None
+
+
+def _page_dir():
+    global _PAGE_DIR
+    if _PAGE_DIR is None:
+        _PAGE_DIR = tempfile.mkdtemp(prefix="ecosizer-charts-")
+    return _PAGE_DIR
+
+
+def cleanup_pages():
+    """Remove the chart pages written by this process."""
+    global _PAGE_DIR
+    if _PAGE_DIR is not None:
+        shutil.rmtree(_PAGE_DIR, ignore_errors=True)
+        _PAGE_DIR = None
+
+
+class ChartView(QWebEngineView):
+    """
+    Web view showing one plotly figure from a page that is loaded only once.
+
+    Scripts run before the page has finished loading are queued and run when it
+    has, so updates can be sent right after show_figure().
+
+    Parameters:
+    -----------
+        name: str
+            Name of the page file, unique per window.
+    """
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.loaded = False
+        self._queued = []
+        self.loadFinished.connect(self._load_finished)
+
+    def show_figure(self, figure):
+        """Write the figure to a local page using the bundled plotly.js and load it."""
+        path = write_page(figure, os.path.join(_page_dir(), f"{self.name}.html"))
+        self.loaded = False
+        self._queued = []
+        self.load(QtCore.QUrl.fromLocalFile(path))
+
+    def run_js(self, script):
+        """Run JavaScript in the page, after it has been loaded."""
+        if self.loaded:
+            self.page().runJavaScript(script)
+        else:
+            self._queued.append(script)
+
+    def restyle(self, update, traces):
+        """Update trace attributes in place, see Plotly.restyle."""
+        self.run_js(f"Plotly.restyle(document.querySelector('.plotly-graph-div'), "
+                    f"{json.dumps(update)}, {json.dumps(traces)});")
+
+    def relayout(self, update):
+        """Update layout attributes in place, see Plotly.relayout."""
+        self.run_js(f"Plotly.relayout(document.querySelector('.plotly-graph-div'), {json.dumps(update)});")
+
+    def _load_finished(self, ok):
+        if not ok:
+            logging.warning(f"Chart page {self.name} could not be loaded")
+            return
+        self.loaded = True
+        for script in self._queued:
+            self.page().runJavaScript(script)
+        self._queued = []
+
+
+# KPI gauges
+#===========#
+class GaugeView(ChartView):
+    """The KPI gauges; the page is built with the first results and restyled afterwards."""
+
+    def __init__(self, parent=None):
+        super().__init__("gauges", parent)
+        self._shown = False
+
+    def set_kpis(self, feed_in, self_consumption, self_sufficiency):
+        """Show the KPIs of a result (all in %)."""
+        feed_in, self_consumption, self_sufficiency = float(feed_in), float(self_consumption), float(self_sufficiency)
+        if not self._shown:
+            self.show_figure(gauge_figure(feed_in, self_consumption, self_sufficiency))
+            self._shown = True
+        else:
+            self.restyle(gauge_update(feed_in, self_consumption, self_sufficiency), [0, 1, 2])
+            self.restyle({'gauge.threshold.value': feed_in}, [0])
+
+
+# Time series
+#============#
+# Reports zoom and pan of the page to the bridge object, debounced while dragging
+_RANGE_SCRIPT = """
+(function() {
+    var gd = document.querySelector('.plotly-graph-div');
+    function toMs(value) {
+        if (typeof value === 'number') return value;
+        var text = value.replace(' ', 'T');
+        if (text.length === 10) text += 'T00:00';
+        return Date.parse(text + 'Z');
+    }
+    function listen(bridge) {
+        var timer = null;
+        gd.on('plotly_relayout', function(event) {
+            var start = null, end = null;
+            for (var key in event) {
+                var part = key.match(/^xaxis\\d*\\.range\\[([01])\\]$/);
+                if (part) { if (part[1] === '0') start = event[key]; else end = event[key]; }
+                else if (/^xaxis\\d*\\.range$/.test(key)) { start = event[key][0]; end = event[key][1]; }
+                else if (/^xaxis\\d*\\.autorange$/.test(key)) { start = end = 'auto'; }
+            }
+            if (start === null || end === null) return;
+            clearTimeout(timer);
+            timer = setTimeout(function() {
+                var width = gd.clientWidth || 1000;
+                if (start === 'auto') bridge.reset(width);
+                else bridge.window(toMs(start), toMs(end), width);
+            }, 100);
+        });
+    }
+    var script = document.createElement('script');
+    script.src = 'qrc:///qtwebchannel/qwebchannel.js';
+    script.onload = function() {
+        new QWebChannel(qt.webChannelTransport, function(channel) { listen(channel.objects.bridge); });
+    };
+    document.head.appendChild(script);
+})();
+"""
+
+
+class _RangeBridge(QtCore.QObject):
+    """Object published to the page; receives the visible range of the time axis."""
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+
+    @QtCore.pyqtSlot(float, float, int)
+    def window(self, start, end, width):
+        self.view.show_window(start, end, width)
+
+    @QtCore.pyqtSlot(int)
+    def reset(self, width):
+        self.view.show_window(None, None, width)
+
+
+class TimeSeriesView(ChartView):
+    """
+    Flows around the electricity bus and state of charge of the last result.
+
+    Only about two points per pixel of the chart width are sent to the page; the
+    full-resolution series stay in Python and zooming requests the points of the
+    visible window.
+    """
+
+    DEFAULT_WIDTH = 1000  # px, until the page reports its width
+
+    def __init__(self, parent=None):
+        super().__init__("timeseries", parent)
+        self.lod = None
+        self._shown = False
+        self._bridge = _RangeBridge(self)
+        self._channel = QWebChannel(self.page())
+        self._channel.registerObject("bridge", self._bridge)
+        self.page().setWebChannel(self._channel)
+
+    def set_result(self, result):
+        """Show the sequences of a SizingResult over its whole horizon."""
+        self.lod = time_series_lod(result)
+        width = self.width() or self.DEFAULT_WIDTH
+        if not self._shown:
+            self.show_figure(time_series_figure(self.lod.window(points=2 * width)))
+            self.run_js(_RANGE_SCRIPT)
+            self._shown = True
+        else:
+            self.show_window(None, None, width)
+            self.relayout({'xaxis.autorange': True, 'yaxis.autorange': True, 'yaxis2.autorange': True})
+
+    def show_window(self, start, end, width):
+        """Send the points of the window [start, end] (epoch ms, None for the whole axis) to the page."""
+        if self.lod is None:
+            return
+        window = self.lod.window(start, end, points=2 * max(width, 100))
+        self.restyle(time_series_update(window), list(range(len(TIME_SERIES_TRACES))))
+
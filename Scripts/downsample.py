@@ -0,0 +1,136 @@
+"""
+Downsample Module
+
+This module reduces long time series to about as many points as a chart can show
+while keeping their visual shape, so a year of hourly or several years of
+quarter-hourly flows can be plotted smoothly. A min/max pass keeps the extremes
+of every bucket and the Largest-Triangle-Three-Buckets (LTTB) pass then picks
+the visually most significant of them.
+
+For zooming, SeriesLevelOfDetail keeps the full resolution series and returns
+the downsampled points of any visible window, so the detail grows as the user
+zooms in while the number of points sent to the chart stays the same.
+
+The module contains the following components:
+- minmax_indices: Indices of the minimum and maximum of every bucket.
+- lttb_indices: Indices selected by Largest-Triangle-Three-Buckets.
+- downsample_indices: Min/max preselection followed by LTTB.
+- SeriesLevelOfDetail: Downsampled windows of a set of series on one time axis.
+
+Usage:
+1. Create SeriesLevelOfDetail(x, {"demand": values, ...}).
+2. Call window(start, end, points) for the visible range of the chart.
+
+"""
+
+
+import numpy as np
+
+
+# Points kept by the min/max preselection per point of the final LTTB output
+MINMAX_RATIO = 4
+
+
+def minmax_indices(y, buckets):
+    """
+    Return the sorted indices of the minimum and maximum of every bucket.
+
+    The series is split into `buckets` buckets of (almost) equal size; the first
+    and last point are always kept. Series with at most 2 * buckets points are
+    returned whole.
+    """
+    n = len(y)
+    if n <= 2 * buckets or buckets < 1:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    y = np.asarray(y, dtype=np.float64)
+    # Reduce every bucket with ufunc.reduceat, then find the positions of the extremes
+    starts = edges[:-1]
+    mins = np.minimum.reduceat(y[:n - 1], starts)
+    maxs = np.maximum.reduceat(y[:n - 1], starts)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    inner = np.arange(1, n - 1)
+    values = y[1:n - 1]
+    first_min = np.full(buckets, n, dtype=np.int64)
+    first_max = np.full(buckets, n, dtype=np.int64)
+    np.minimum.at(first_min, bucket[values == mins[bucket]], inner[values == mins[bucket]])
+    np.minimum.at(first_max, bucket[values == maxs[bucket]], inner[values == maxs[bucket]])
+    indices = np.concatenate(([0], first_min, first_max, [n - 1]))
+    return np.unique(indices[indices < n])
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Return the indices of `threshold` points selected by Largest-Triangle-Three-Buckets.
+
+    Every bucket contributes the point forming the largest triangle with the
+    point selected in the previous bucket and the average of the next bucket.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_indices(x, y, points):
+    """Return the indices of about `points` points: min/max preselection, then LTTB."""
+    if len(y) <= points:
+        return np.arange(len(y))
+    candidates = minmax_indices(y, points * MINMAX_RATIO // 2)
+    return candidates[lttb_indices(x[candidates], np.asarray(y)[candidates], points)]
+
+
+class SeriesLevelOfDetail:
+    """
+    Full-resolution series on one time axis, downsampled per visible window.
+
+    Parameters:
+    -----------
+        x: array_like
+            Increasing time axis, e.g. epoch milliseconds.
+        series: dict
+            Series name mapped to values of the same length as `x`.
+    """
+
+    def __init__(self, x, series):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.series = {name: np.asarray(values, dtype=np.float64) for name, values in series.items()}
+        for name, values in self.series.items():
+            if len(values) != len(self.x):
+                raise ValueError(f"Series {name} has {len(values)} values, the time axis {len(self.x)}")
+
+    def window(self, start=None, end=None, points=2000):
+        """
+        Return the downsampled series within [start, end] (the whole axis if None).
+
+        One point outside the window is kept on either side, so lines run to the
+        edges of the chart.
+
+        Returns:
+        --------
+            dict
+                Series name mapped to a tuple of x and y arrays.
+        """
+        low = 0 if start is None else max(int(np.searchsorted(self.x, start, 'left')) - 1, 0)
+        high = len(self.x) if end is None else min(int(np.searchsorted(self.x, end, 'right')) + 1, len(self.x))
+        x = self.x[low:high]
+        window = {}
+        for name, values in self.series.items():
+            indices = downsample_indices(x, values[low:high], points)
+            window[name] = (x[indices], values[low:high][indices])
+        return window
@@ -0,0 +1,292 @@
+"""
+EcoSizer Command-Line Module
+
+This module is the command-line entry point of the EcoSizer sizing model for
+scripted and headless runs. It only uses the sizing engine, so it runs without
+X11, Qt or QtWebEngine.
+
+    python ecosizer.py size --mode pv-bess --pv-capex 1200 --bess-capex 700 \\
+        --price 35 --fit 8 --demand 4500
+    python ecosizer.py sweep config.yaml --jobs 8
+
+`size` prints the capacities, energy balance, KPIs and financial key figures of
+one household as JSON (or writes them to --output as JSON or CSV). `sweep` runs
+the grid of a YAML or JSON configuration file with run_sweep and prints a
+summary. The configuration holds the keys of run_sweep:
+
+    grid:                      # SizingParams fields mapped to the values to sweep
+      bess_capex: [300, 500, 700]
+      electricity_price: [30, 35, 40]
+    output: results.csv        # CSV file, or directory of a Parquet dataset
+    mode: pv-bess              # optional
+    fixed: {annual_demand: 4500}  # optional SizingParams fields of all cases
+    engine: {solver: highs}    # optional SizingEngine arguments; --solver etc. override them
+    sequences: false           # optional, store the bus flows (Parquet only)
+
+The module contains the following components:
+- EXIT_OK / EXIT_FAILED / EXIT_USAGE / EXIT_ERROR: Exit codes of the commands.
+- build_parser: The argument parser with the size and sweep subcommands.
+- main: Run a command and return its exit code.
+
+Usage:
+1. Run `python ecosizer.py --help` or `python ecosizer.py size --help`.
+
+"""
+
+
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+from dataclasses import fields
+from sizing_params import SizingParams, MODES
+
+
+EXIT_OK = 0       # everything was sized
+EXIT_FAILED = 1   # the case or some cases of a sweep could not be solved
+EXIT_USAGE = 2    # invalid arguments or configuration (also used by argparse)
+EXIT_ERROR = 3    # the run could not be started, e.g. missing input files or solver
+
+# Options of `size` mapped to SizingParams fields; the others are set with --param
+SIZE_OPTIONS = {
+    'mode': 'mode',
+    'pv_capex': 'pv_capex',
+    'bess_capex': 'bess_capex',
+    'price': 'electricity_price',
+    'fit': 'feedin_price',
+    'demand': 'annual_demand',
+    'pv_capacity': 'pv_capacity',
+}
+
+SWEEP_KEYS = ('grid', 'output', 'mode', 'fixed', 'engine', 'sequences')
+
+
+class UsageError(Exception):
+    """Invalid arguments or configuration, reported with EXIT_USAGE."""
+
+
+def _parse_value(text):
+    """Return a --param value as number, None or string."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _params_fields():
+    return {field.name for field in fields(SizingParams)}
+
+
+def _params(values):
+    unknown = set(values) - _params_fields()
+    if unknown:
+        raise UsageError(f"Unknown SizingParams fields: {', '.join(sorted(unknown))}")
+    try:
+        return SizingParams(**values)
+    except (TypeError, ValueError) as e:
+        raise UsageError(str(e))
+
+
+def _engine_kwargs(args):
+    """Return the SizingEngine arguments of the options given on the command line."""
+    kwargs = {}
+    if args.solver:
+        kwargs['solver'] = args.solver
+    if args.input_dir:
+        kwargs['input_dir'] = args.input_dir
+    if args.library:
+        kwargs['library'] = args.library
+    if args.presolve:
+        kwargs['presolve'] = True
+    if args.telemetry:
+        from telemetry import Telemetry
+        kwargs['telemetry'] = Telemetry(jsonl_path=args.telemetry)
+    return kwargs
+
+
+def build_parser():
+    """Return the argument parser of the command line."""
+    parser = argparse.ArgumentParser(prog="ecosizer", description="Size PV and battery storage of households.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log the progress of the run")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    defaults = SizingParams()
+    size = subparsers.add_parser("size", help="size one household")
+    size.add_argument("--mode", choices=MODES, default=defaults.mode,
+                      help="pv-bess sizes PV and storage, bess only the storage for an existing PV system")
+    size.add_argument("--pv-capex", type=float, default=defaults.pv_capex, help="PV CAPEX in €/kWp")
+    size.add_argument("--bess-capex", type=float, default=defaults.bess_capex, help="storage CAPEX in €/kWh")
+    size.add_argument("--price", type=float, default=defaults.electricity_price,
+                      help="electricity price in €-cents/kWh")
+    size.add_argument("--fit", type=float, default=defaults.feedin_price, help="feed-in tariff in €-cents/kWh")
+    size.add_argument("--demand", type=float, default=defaults.annual_demand, help="annual demand in kWh/Yr")
+    size.add_argument("--pv-capacity", type=float, default=defaults.pv_capacity,
+                      help="existing PV system in kWp (bess mode)")
+    size.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                      help="further SizingParams field, e.g. --param wacc=0.05; repeatable")
+    size.add_argument("--typical-days", type=int, help="solve on this many typical days instead of the full year")
+    size.add_argument("--output", help="write the result to this .json or .csv file instead of stdout")
+
+    sweep = subparsers.add_parser("sweep", help="run a parameter sweep from a YAML or JSON configuration")
+    sweep.add_argument("config", help="configuration file (.yaml, .yml or .json)")
+    sweep.add_argument("--jobs", type=int, help="number of worker processes, defaults to the number of CPUs")
+    sweep.add_argument("--output", help="results file or dataset, overrides the configuration")
+
+    for command in (size, sweep):
+        command.add_argument("--solver", help="LP solver (default glpk), falls back to an installed one")
+        command.add_argument("--input-dir", help="directory of the load and PV profiles")
+        command.add_argument("--library", metavar="FILE",
+                             help="profile library (.npy) of the pv_profile_key and load_profile_key parameters")
+        command.add_argument("--presolve", action="store_true",
+                             help="fix the flows determined by the sign of the net load before solving")
+        command.add_argument("--telemetry", metavar="FILE",
+                             help="append the duration, memory and model size of every stage as JSON lines")
+    return parser
+
+
+# Commands
+#=========#
+def _size_record(result):
+    """Return the parameters, results and financial key figures of a SizingResult as flat dictionary."""
+    from finance import analyse_results
+    finance = analyse_results([result])
+    record = {**result.params.to_dict(), **result.kpis()}
+    record.update({
+        'investment': float(finance.investment[0]),
+        'annual_savings': float(finance.annual_savings[0]),
+        'npv': float(finance.npv[0]),
+        'irr': float(finance.irr[0]),
+        'lcoe': float(finance.lcoe[0]),
+        'simple_payback': float(finance.simple_payback[0]),
+        'discounted_payback': float(finance.discounted_payback[0]),
+        'solver': result.solver,
+        'solve_time': result.solve_time,
+    })
+    return record
+
+
+def _json_value(value):
+    # JSON has no inf/NaN: not paid back or no IRR are written as null
+    if isinstance(value, float) and (value != value or value in (float('inf'), float('-inf'))):
+        return None
+    return value
+
+
+def run_size(args):
+    values = {field: getattr(args, option) for option, field in SIZE_OPTIONS.items()}
+    for item in args.param:
+        name, separator, text = item.partition('=')
+        if not separator:
+            raise UsageError(f"--param expects NAME=VALUE, got {item!r}")
+        values[name.strip()] = _parse_value(text.strip())
+    params = _params(values)
+
+    from sizing_engine import SizingEngine
+    try:
+        engine = SizingEngine(**_engine_kwargs(args))
+    except (OSError, RuntimeError, ValueError) as e:
+        logging.error(f"Could not set up the sizing engine: {e}")
+        return EXIT_ERROR
+    try:
+        result = engine.size(params, typical_days=args.typical_days)
+    except Exception as e:
+        logging.error(f"Sizing failed: {type(e).__name__}: {e}")
+        return EXIT_FAILED
+
+    record = {name: _json_value(value) for name, value in _size_record(result).items()}
+    if args.output and args.output.endswith('.csv'):
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(record))
+            writer.writeheader()
+            writer.writerow(record)
+    elif args.output:
+        with open(args.output, 'w') as f:
+            json.dump(record, f, indent=2)
+    else:
+        json.dump(record, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return EXIT_OK
+
+
+def load_config(path):
+    """Return the sweep configuration of a YAML or JSON file."""
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise UsageError("YAML configurations need PyYAML: pip install pyyaml, or use a .json file")
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    if not isinstance(config, dict):
+        raise UsageError(f"{path} does not hold a mapping of sweep settings")
+    unknown = set(config) - set(SWEEP_KEYS)
+    if unknown:
+        raise UsageError(f"Unknown keys in {path}: {', '.join(sorted(unknown))}, expected {SWEEP_KEYS}")
+    grid = config.get('grid')
+    if not isinstance(grid, dict) or not grid:
+        raise UsageError(f"{path} needs a 'grid' mapping SizingParams fields to lists of values")
+    for key in ('grid', 'fixed'):
+        if 'mode' in (config.get(key) or {}):
+            raise UsageError(f"Set the mode with the top-level 'mode' key of {path}, not in '{key}'")
+    names = set(grid) | set(config.get('fixed') or {})
+    if names - _params_fields():
+        raise UsageError(f"Unknown SizingParams fields in {path}: {', '.join(sorted(names - _params_fields()))}")
+    config['grid'] = {name: values if isinstance(values, list) else [values] for name, values in grid.items()}
+    return config
+
+
+def run_sweep_command(args):
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        raise UsageError(f"Could not read {args.config}: {e}")
+    output = args.output or config.get('output')
+    if not output:
+        raise UsageError("No results file: set 'output' in the configuration or pass --output")
+    mode = config.get('mode', SizingParams.mode)
+    if mode not in MODES:
+        raise UsageError(f"Unknown sizing mode {mode!r}, expected one of {MODES}")
+    if config.get('sequences') and output.endswith('.csv'):
+        raise UsageError(f"Sequences are only stored in Parquet results, not in the CSV file {output}")
+    # Options given on the command line override the configuration, like --output
+    engine_kwargs = {**(config.get('engine') or {}), **_engine_kwargs(args)}
+
+    from sizing_engine import check_engine_kwargs
+    try:
+        check_engine_kwargs(engine_kwargs)
+    except (OSError, RuntimeError, ValueError) as e:
+        logging.error(f"Could not set up the sizing engine: {e}")
+        return EXIT_ERROR
+
+    from sweep import run_sweep
+    try:
+        summary = run_sweep(config['grid'], output, mode=mode, jobs=args.jobs, engine_kwargs=engine_kwargs,
+                            sequences=bool(config.get('sequences')), **(config.get('fixed') or {}))
+    except ImportError as e:
+        logging.error(str(e))
+        return EXIT_ERROR
+    json.dump({**summary, 'output': os.path.abspath(output)}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return EXIT_FAILED if summary['failed'] else EXIT_OK
+
+
+def main(argv=None):
+    """Run the command line and return its exit code."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    try:
+        if args.command == "size":
+            return run_size(args)
+        return run_sweep_command(args)
+    except UsageError as e:
+        logging.error(str(e))
+        return EXIT_USAGE
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Finance Module
+
+This module contains the financial analysis of sizing results as NumPy array
+operations. Where `update_costs` of the GUIs computes the yearly costs, savings
+and payback of the one scenario on screen, the functions here take arrays of
+capacities, energies and prices (one element per scenario) and evaluate any
+number of scenarios in one call.
+
+Cash flows cover the PV lifetime year by year: the investment in year 0, then
+the energy bill savings plus FiT income of every year, reduced by the
+degradation of the PV output, storage replacements at the end of every storage
+lifetime and the residual value of the last storage at the end. Lifetimes and
+WACC default to the values used for the annuities of the optimisation model.
+
+The module contains the following components:
+- cash_flows: Degradation-adjusted yearly cash flows of every scenario.
+- npv / irr / discounted_payback / lcoe: Key figures from the cash flows.
+- FinanceResult: All key figures of a set of scenarios as arrays.
+- analyse / analyse_results: Full analysis from arrays or from SizingResults.
+
+Usage:
+1. Size the scenarios with the sizing engine.
+2. Call analyse_results(results) and read the arrays of the FinanceResult.
+
+"""
+
+
+from dataclasses import dataclass
+import numpy as np
+from sizing_params import SizingParams
+
+
+# Same lifetimes and WACC as the annuities of the optimisation model
+PV_LIFETIME = SizingParams.pv_lifetime
+BESS_LIFETIME = SizingParams.bess_lifetime
+WACC = SizingParams.wacc
+DEGRADATION = 0.005  # yearly loss of PV output
+
+
+@dataclass
+class FinanceResult:
+    """
+    Financial key figures of a set of scenarios, one array element per scenario.
+
+    Savings and investments are given in €, the LCOE in €/kWh, the paybacks in
+    years (inf if the investment is not paid back within the lifetime) and the
+    IRR as fraction (NaN if there is none). `cash_flows` has one row per scenario
+    and one column per year, starting with the investment in year 0.
+    """
+    investment: np.ndarray
+    annual_savings: np.ndarray
+    cash_flows: np.ndarray
+    npv: np.ndarray
+    irr: np.ndarray
+    lcoe: np.ndarray
+    simple_payback: np.ndarray
+    discounted_payback: np.ndarray
+
+
+def _column(value):
+    """Return a value or array as float column vector for broadcasting over years."""
+    return np.asarray(value, dtype=float).reshape(-1, 1)
+
+
+def degradation_factors(years=PV_LIFETIME, degradation=DEGRADATION):
+    """Return the PV output of operating years 1..years relative to the first year."""
+    return (1 - degradation) ** np.arange(years)
+
+
+def cash_flows(pv_investment, bess_investment, annual_demand, grid_import, grid_feed_in, total_pv_production,
+               electricity_price, feedin_price, years=PV_LIFETIME, bess_lifetime=BESS_LIFETIME,
+               degradation=DEGRADATION, price_escalation=0.0):
+    """
+    Return the yearly cash flows of every scenario.
+
+    The savings of a year are the bill without PV minus the bill with PV and
+    storage plus the FiT income. PV degradation reduces the self-consumed and the
+    fed-in energy alike; the self-consumption lost has to be bought from the grid.
+
+    Parameters:
+    -----------
+        pv_investment, bess_investment: array_like
+            Investments in year 0 (€); the storage is bought again after every
+            `bess_lifetime` years and its remaining value is credited at the end.
+        annual_demand, grid_import, grid_feed_in, total_pv_production: array_like
+            Energies of the first year in kWh/Yr, as in SizingResult.
+        electricity_price, feedin_price: array_like
+            Prices in €-cents/kWh.
+        years: int
+            Number of operating years, the PV lifetime by default.
+        price_escalation: float
+            Yearly increase of the electricity price; the FiT is fixed.
+
+    Returns:
+    --------
+        numpy.ndarray
+            Cash flows of shape (scenarios, years + 1) in €.
+    """
+    pv_investment, bess_investment = _column(pv_investment), _column(bess_investment)
+    price = _column(electricity_price) / 100 * (1 + price_escalation) ** np.arange(years)
+    fit = _column(feedin_price) / 100
+    factors = degradation_factors(years, degradation)
+
+    feed_in = _column(grid_feed_in) * factors
+    self_consumption = _column(total_pv_production) - _column(grid_feed_in)
+    grid_import = _column(grid_import) + self_consumption * (1 - factors)
+    savings = (_column(annual_demand) - grid_import) * price + feed_in * fit
+
+    n = max(len(savings), len(pv_investment), len(bess_investment))
+    flows = np.zeros((n, years + 1))
+    flows[:, 0] = -(pv_investment + bess_investment)[:, 0]
+    flows[:, 1:] = savings
+    for year in range(bess_lifetime, years, bess_lifetime):
+        flows[:, year] -= bess_investment[:, 0]
+    # Linear residual value of the storage bought last
+    remaining = (-years) % bess_lifetime
+    flows[:, years] += bess_investment[:, 0] * remaining / bess_lifetime
+    return flows
+
+
+def discount_factors(years, wacc=WACC):
+    """Return the discount factors of years 0..years."""
+    return (1 + np.asarray(wacc, dtype=float).reshape(-1, 1)) ** -np.arange(years + 1)
+
+
+def npv(flows, wacc=WACC):
+    """Return the net present value of every row of cash flows."""
+    return (flows * discount_factors(flows.shape[1] - 1, wacc)).sum(axis=1)
+
+
+def irr(flows, low=-0.99, high=1.0, tol=1e-7, max_iter=200):
+    """
+    Return the internal rate of return of every row of cash flows.
+
+    All rows are solved together by bisection between `low` and `high`; rows
+    whose NPV does not change sign in this interval get NaN.
+    """
+    n = flows.shape[0]
+    low, high = np.full(n, low), np.full(n, high)
+    npv_low = npv(flows, low)
+    valid = np.sign(npv_low) != np.sign(npv(flows, high))
+    for _ in range(max_iter):
+        mid = (low + high) / 2
+        npv_mid = npv(flows, mid)
+        same = np.sign(npv_mid) == np.sign(npv_low)
+        low = np.where(same, mid, low)
+        npv_low = np.where(same, npv_mid, npv_low)
+        high = np.where(same, high, mid)
+        if np.max(high - low) < tol:
+            break
+    return np.where(valid, (low + high) / 2, np.nan)
+
+
+def discounted_payback(flows, wacc=WACC):
+    """
+    Return the discounted payback period (years) of every row of cash flows.
+
+    The year in which the discounted cumulative cash flow turns positive is
+    interpolated linearly; rows that are never paid back get inf.
+    """
+    cumulative = np.cumsum(flows * discount_factors(flows.shape[1] - 1, wacc), axis=1)
+    paid = cumulative >= 0
+    year = paid.argmax(axis=1)
+    rows = np.arange(len(flows))
+    before = cumulative[rows, np.maximum(year - 1, 0)]
+    step = cumulative[rows, year] - before
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(step > 0, -before / step, 0.0)
+    payback = np.where(year > 0, year - 1 + fraction, 0.0)
+    return np.where(paid.any(axis=1), payback, np.inf)
+
+
+def lcoe(cost_flows, total_pv_production, wacc=WACC, degradation=DEGRADATION):
+    """
+    Return the levelised cost of PV electricity (€/kWh) of every scenario.
+
+    `cost_flows` are the cash flows without savings (investments, replacements
+    and residual value); they are discounted and divided by the discounted,
+    degraded PV production.
+    """
+    years = cost_flows.shape[1] - 1
+    factors = discount_factors(years, wacc)
+    energy = (_column(total_pv_production) * degradation_factors(years, degradation) * factors[:, 1:]).sum(axis=1)
+    costs = -(cost_flows * factors).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(energy > 0, costs / energy, np.nan)
+
+
+def analyse(pv_capacity, storage_capacity, pv_capex, bess_capex, annual_demand, grid_import, grid_feed_in,
+            total_pv_production, electricity_price, feedin_price, wacc=WACC, years=PV_LIFETIME,
+            bess_lifetime=BESS_LIFETIME, degradation=DEGRADATION, price_escalation=0.0):
+    """
+    Compute all financial key figures of a set of scenarios.
+
+    All scenario inputs may be scalars or arrays of equal length; capacities in
+    kWp and kWh, CAPEX in €/kWp and €/kWh, energies in kWh/Yr and prices in
+    €-cents/kWh.
+
+    Returns:
+    --------
+        FinanceResult
+    """
+    pv_investment = np.asarray(pv_capacity, dtype=float) * pv_capex
+    bess_investment = np.asarray(storage_capacity, dtype=float) * bess_capex
+    energies = dict(annual_demand=annual_demand, grid_import=grid_import, grid_feed_in=grid_feed_in,
+                    total_pv_production=total_pv_production)
+    options = dict(years=years, bess_lifetime=bess_lifetime, degradation=degradation)
+
+    flows = cash_flows(pv_investment, bess_investment, **energies, electricity_price=electricity_price,
+                       feedin_price=feedin_price, price_escalation=price_escalation, **options)
+    costs = cash_flows(pv_investment, bess_investment, **dict.fromkeys(energies, 0), electricity_price=0,
+                       feedin_price=0, **options)
+    costs = np.broadcast_to(costs, flows.shape)
+
+    investment = -flows[:, 0]
+    annual_savings = flows[:, 1] - costs[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        simple_payback = np.where(annual_savings > 0, investment / annual_savings, np.inf)
+    return FinanceResult(
+        investment=investment,
+        annual_savings=annual_savings,
+        cash_flows=flows,
+        npv=npv(flows, wacc),
+        irr=irr(flows),
+        lcoe=lcoe(costs, total_pv_production, wacc, degradation),
+        simple_payback=simple_payback,
+        discounted_payback=discounted_payback(flows, wacc),
+    )
+
+
+def analyse_results(results, **kwargs):
+    """
+    Compute the financial key figures of a list of SizingResults.
+
+    Prices, CAPEX, WACC and lifetimes are taken from the parameters of every
+    result, so the figures match the case the result was sized for. Results
+    with other lifetimes have cash flows of another length; they are analysed
+    in groups and `cash_flows` is padded with zeros after the end of the
+    shorter lifetimes. Like `update_costs` of the GUIs, the PV system is
+    counted as investment in both modes. Further keyword arguments are passed
+    on to `analyse` and take precedence over the parameters.
+    """
+    groups = {}
+    for index, result in enumerate(results):
+        groups.setdefault((result.params.pv_lifetime, result.params.bess_lifetime), []).append(index)
+    if len(groups) <= 1:
+        lifetimes = next(iter(groups), (PV_LIFETIME, BESS_LIFETIME))
+        return _analyse_group(results, *lifetimes, **kwargs)
+
+    parts = [(indices, _analyse_group([results[i] for i in indices], *lifetimes, **kwargs))
+             for lifetimes, indices in groups.items()]
+    width = max(part.cash_flows.shape[1] for _, part in parts)
+    merged = {}
+    for name in FinanceResult.__dataclass_fields__:
+        merged[name] = np.zeros((len(results), width)) if name == 'cash_flows' else np.empty(len(results))
+        for indices, part in parts:
+            values = getattr(part, name)
+            if name == 'cash_flows':
+                merged[name][indices, :values.shape[1]] = values
+            else:
+                merged[name][indices] = values
+    return FinanceResult(**merged)
+
+
+def _analyse_group(results, pv_lifetime, bess_lifetime, **kwargs):
+    """Return the key figures of SizingResults with the same PV and storage lifetime."""
+    def field(get):
+        return np.fromiter((get(result) for result in results), dtype=float, count=len(results))
+
+    options = dict(wacc=field(lambda r: r.params.wacc), years=pv_lifetime, bess_lifetime=bess_lifetime)
+    options.update(kwargs)
+    return analyse(
+        pv_capacity=field(lambda r: r.pv_capacity),
+        storage_capacity=field(lambda r: r.storage_capacity),
+        pv_capex=field(lambda r: r.params.pv_capex),
+        bess_capex=field(lambda r: r.params.bess_capex),
+        annual_demand=field(lambda r: r.total_demand),
+        grid_import=field(lambda r: r.grid_import),
+        grid_feed_in=field(lambda r: r.grid_feed_in),
+        total_pv_production=field(lambda r: r.total_pv_production),
+        electricity_price=field(lambda r: r.params.electricity_price),
+        feedin_price=field(lambda r: r.params.feedin_price),
+        **options,
+    )
@@ -0,0 +1,222 @@
+"""
+Portfolio Module
+
+This module sizes PV and storage for a portfolio of households with their own
+measured load profiles instead of the scaled BDEW H0 profile. The load profiles
+are read once, stored as one memory-mapped matrix and solved in parallel by worker
+processes that each set up a SizingEngine (and with it the shared PV profile)
+only once. Every household gets its annual demand from its own profile.
+
+The module contains the following components:
+- read_households: Read load profiles from a wide CSV/Parquet file or a directory.
+- PortfolioResult: Per-household results table and fleet aggregates.
+- run_portfolio: Size all households of a portfolio in parallel.
+
+Usage:
+1. Put the load profiles in one wide file (one column per household, timestamps
+   in the first column) or in a directory with one file per household. They need
+   the length and resolution of the PV profile.
+2. Call run_portfolio("loads.csv", SizingParams(electricity_price=35)).
+
+"""
+
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import multiprocessing
+from dataclasses import dataclass, replace
+import numpy as np
+import pandas as pd
+from sizing_engine import (SizingEngine, SizingParams, INPUT_DIR, LOAD_PROFILE_FILE, HOURS_PER_YEAR,
+                           profile_resolution, check_engine_kwargs, share)
+from sweep import RESULT_COLUMNS, STATUS_COLUMNS
+
+
+PROFILE_EXTENSIONS = ('.csv', '.parquet')
+UNITS = ('kWh', 'kW')
+
+
+def _read_table(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, index_col=0)
+
+
+def read_households(source):
+    """
+    Read household load profiles.
+
+    Parameters:
+    -----------
+        source: str
+            Wide CSV or Parquet file with one column per household (the first
+            CSV column holds the timestamps), or a directory with one such file
+            per household, named after the household.
+
+    Returns:
+    --------
+        pandas.DataFrame
+            One column of load values per household.
+    """
+    if not os.path.isdir(source):
+        return _read_table(source).select_dtypes('number')
+
+    columns = {}
+    for name in sorted(os.listdir(source)):
+        household, extension = os.path.splitext(name)
+        if extension not in PROFILE_EXTENSIONS:
+            continue
+        table = _read_table(os.path.join(source, name)).select_dtypes('number')
+        if table.shape[1] != 1:
+            raise ValueError(f"{name} has {table.shape[1]} load columns, expected one per file")
+        columns[household] = table.iloc[:, 0].to_numpy()
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"The household profiles in {source} differ in length: {sorted(lengths)}")
+    return pd.DataFrame(columns)
+
+
+@dataclass
+class PortfolioResult:
+    """
+    Results of a portfolio run.
+
+    `households` has one row per household with its annual demand, the results
+    columns of a sweep and the status; `fleet` holds the aggregates of all
+    households solved successfully (sums in kWp, kWh and kWh/Yr, KPIs in %).
+    """
+    households: pd.DataFrame
+    fleet: dict
+
+
+# Worker process
+#===============#
+_worker_engine = None
+_worker_loads = None
+_worker_error = None
+
+
+def _init_worker(engine_kwargs, loads_file):
+    """Create the engine of a worker process and map the household profiles."""
+    global _worker_engine, _worker_loads, _worker_error
+    try:
+        _worker_engine = SizingEngine(**engine_kwargs)
+        _worker_loads = np.load(loads_file, mmap_mode='r')
+    except Exception as e:  # a failing initializer makes the pool respawn workers forever
+        _worker_error = f"Engine setup failed: {type(e).__name__}: {e}"
+
+
+def _solve_household(task):
+    column, params = task
+    if _worker_error:
+        return column, None, _worker_error
+    try:
+        result = _worker_engine.size(params, load_profile=_worker_loads[column])
+    except Exception as e:  # keep the portfolio going, the failure is recorded in the row
+        return column, None, f"{type(e).__name__}: {e}"
+    return column, result.kpis(), ""
+
+
+def fleet_aggregates(households):
+    """Return the fleet aggregates of a per-household results table."""
+    ok = households[households['status'] == 'ok']
+    demand = ok['total_demand'].sum()
+    pv_production = ok['total_pv_production'].sum()
+    grid_feed_in = ok['grid_feed_in'].sum()
+    grid_import = ok['grid_import'].sum()
+    return {
+        'households': len(households),
+        'failed': int((households['status'] != 'ok').sum()),
+        'pv_capacity': float(ok['pv_capacity'].sum()),
+        'storage_capacity': float(ok['storage_capacity'].sum()),
+        'total_demand': float(demand),
+        'total_pv_production': float(pv_production),
+        'grid_feed_in': float(grid_feed_in),
+        'grid_import': float(grid_import),
+        'self_consumption': share(pv_production - grid_feed_in, pv_production),
+        'self_sufficiency': share(demand - grid_import, demand),
+        'feed_in_percentage': share(grid_feed_in, pv_production),
+        'median_pv_capacity': float(ok['pv_capacity'].median()) if len(ok) else 0.0,
+        'median_storage_capacity': float(ok['storage_capacity'].median()) if len(ok) else 0.0,
+    }
+
+
+# Public API
+#===========#
+def run_portfolio(source, params=None, jobs=None, chunksize=None, engine_kwargs=None, unit='kWh'):
+    """
+    Size every household of a portfolio in parallel.
+
+    Parameters:
+    -----------
+        source: str or pandas.DataFrame
+            File or directory read with `read_households`, or a DataFrame with
+            one load column per household.
+        params: SizingParams
+            Prices, CAPEX and mode shared by all households; the annual demand
+            is replaced by the one of every household profile.
+        jobs: int
+            Number of worker processes, defaults to the number of CPUs.
+        engine_kwargs: dict
+            Arguments for the SizingEngine of every worker, e.g. {"solver": "highs"}.
+        unit: str
+            "kWh" if the profiles hold the energy of every timestep, "kW" if
+            they hold the average power.
+
+    Returns:
+    --------
+        PortfolioResult
+
+    Raises:
+    -------
+        OSError, RuntimeError or ValueError
+            If the engine can not be set up with `engine_kwargs`, see
+            sizing_engine.check_engine_kwargs.
+    """
+    if unit not in UNITS:
+        raise ValueError(f"Unknown load unit {unit!r}, expected one of {UNITS}")
+    params = params or SizingParams()
+    engine_kwargs = engine_kwargs or {}
+    check_engine_kwargs(engine_kwargs)
+    loads = source if isinstance(source, pd.DataFrame) else read_households(source)
+    timestep_hours = engine_kwargs.get('timestep_hours') or profile_resolution(
+        os.path.join(engine_kwargs.get('input_dir', INPUT_DIR), LOAD_PROFILE_FILE))
+
+    # Scale to the units of the engine's load profile: kW per MWh of annual demand
+    power = loads.to_numpy(dtype=float) / (timestep_hours if unit == 'kWh' else 1)
+    years = len(power) * timestep_hours / HOURS_PER_YEAR
+    annual_demand = power.sum(axis=0) * timestep_hours / years
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalised = np.nan_to_num(power / annual_demand * 1000)
+    tasks = [(column, replace(params, annual_demand=float(demand))) for column, demand in enumerate(annual_demand)]
+
+    jobs = min(jobs or os.cpu_count() or 1, max(len(tasks), 1))
+    chunksize = chunksize or max(1, len(tasks) // (jobs * 4))
+    logging.info(f"Portfolio of {len(tasks)} households on {jobs} processes")
+    rows = [None] * len(tasks)
+    tmp_dir = tempfile.mkdtemp(prefix="ecosizer-portfolio-")
+    start = time.perf_counter()
+    try:
+        loads_file = os.path.join(tmp_dir, "households.npy")
+        np.save(loads_file, np.ascontiguousarray(normalised.T))  # workers map it instead of receiving copies
+        with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(engine_kwargs, loads_file)) as pool:
+            for done, (column, kpis, error) in enumerate(
+                    pool.imap_unordered(_solve_household, tasks, chunksize=chunksize), 1):
+                row = {'household': loads.columns[column], 'annual_demand': annual_demand[column]}
+                if error:
+                    row.update(status='failed', error=error)
+                else:
+                    row.update({name: kpis[name] for name in RESULT_COLUMNS}, status='ok', error='')
+                rows[column] = row
+                if done % 100 == 0:
+                    logging.info(f"Portfolio progress: {done}/{len(tasks)} households")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logging.info(f"Portfolio sized in {time.perf_counter() - start:.1f} s")
+
+    households = pd.DataFrame(rows, columns=['household', 'annual_demand'] + RESULT_COLUMNS + STATUS_COLUMNS)
+    households = households.set_index('household')
+    return PortfolioResult(households=households, fleet=fleet_aggregates(households))
@@ -0,0 +1,126 @@
+"""
+Presolve Module
+
+This module shrinks the LP of a sizing case before it is passed to the solver.
+PV feed-in and demand are fixed profiles, so in many timesteps the sign of the
+net load (demand minus PV) is known before solving. As long as buying from the
+grid costs at least the feed-in tariff and the storage has no gains (conversion
+factors <= 1), there is an optimal solution in which
+
+- timesteps with a deficit (demand >= PV) neither feed into the grid nor charge
+  the storage, and
+- timesteps with a surplus (PV > demand) neither import from the grid nor
+  discharge the storage.
+
+The flow variables determined this way are fixed to zero; pyomo passes fixed
+variables to the solver as constants, so only the reduced LP is solved. The
+fixed flows keep their value in the model, so the results of all timesteps are
+read as before and the objective is the same as without presolve.
+
+With the PV capacity as decision (mode "pv-bess"), a deficit is only certain
+where the PV profile at the capacity limit stays below the demand, e.g. in all
+hours without sunlight; surplus timesteps need the PV size of mode "bess".
+
+The argument needs the storage to cycle over the whole horizon with equally
+weighted timesteps. It does not hold for typical days, whose storage level is
+shared by representative days of different weights (grid charging at the end
+of a day can pay off there), so the engine only presolves full-year models.
+
+The module contains the following components:
+- PresolveStats: Number of fixed flow variables and the timesteps they belong to.
+- applicable: Whether the prices and storage parameters of a case allow presolve.
+- fix_determined_flows: Fix the determined flows of a built model.
+
+Usage:
+1. Create the engine with SizingEngine(presolve=True); the statistics of every
+   presolve are reported with the build stage of the telemetry.
+
+"""
+
+
+from dataclasses import dataclass, asdict
+import numpy as np
+from sizing_params import MODE_PV_BESS
+
+
+@dataclass
+class PresolveStats:
+    """
+    Reduction of one model by fix_determined_flows.
+
+    `deficit_steps` and `surplus_steps` count the timesteps of known sign,
+    `fixed_variables` the flow variables fixed to zero and `variables` the
+    number of variables of the model before presolve.
+    """
+    timesteps: int
+    deficit_steps: int
+    surplus_steps: int
+    fixed_variables: int
+    variables: int
+
+    def fixed_share(self):
+        """Return the fixed variables in % of all variables."""
+        return self.fixed_variables / self.variables * 100 if self.variables else 0.0
+
+    def to_dict(self):
+        return dict(asdict(self), fixed_share=round(self.fixed_share(), 1))
+
+
+def applicable(params):
+    """
+    Return whether fixing the determined flows keeps the optimum of a case.
+
+    Grid energy must not be worth storing or selling (0 <= feed-in tariff <=
+    electricity price) and the storage must not gain energy.
+    """
+    return (0 <= params.electricity_price and params.feedin_price <= params.electricity_price
+            and params.inflow_conversion_factor <= 1 and params.outflow_conversion_factor <= 1
+            and params.loss_rate >= 0)
+
+
+def fix_determined_flows(om, components, params, load_profile, pv_profile):
+    """
+    Fix the flows of all timesteps with known sign of the net load to zero.
+
+    Parameters:
+    -----------
+        om: solph.Model
+            Built, not yet solved model of the case.
+        components: dict
+            Components of the model, as returned by SizingEngine.build_model.
+        params: SizingParams
+            The case; must be `applicable`.
+        load_profile, pv_profile: array_like
+            The profiles the model was built with, one value per timestep.
+
+    Returns:
+    --------
+        PresolveStats
+    """
+    variables = om.nvariables()
+    demand = np.asarray(load_profile, dtype=np.float64) * params.annual_demand / 1000
+    pv = np.asarray(pv_profile, dtype=np.float64)
+    if params.mode == MODE_PV_BESS:
+        deficit = pv * params.pv_limit() <= demand
+        surplus = np.zeros_like(deficit)
+    else:
+        deficit = pv * params.pv_capacity <= demand
+        surplus = ~deficit
+
+    bus, storage = components["bus"], components["storage"]
+    deficit_flows = ((bus, components["grid_feed_in"]), (bus, storage))
+    surplus_flows = ((components["grid_supply"], bus), (storage, bus))
+    flow = om.flow
+    fixed = 0
+    for p, t in om.TIMEINDEX:
+        if deficit[t]:
+            pairs = deficit_flows
+        elif surplus[t]:
+            pairs = surplus_flows
+        else:
+            continue
+        for source, target in pairs:
+            flow[source, target, p, t].fix(0)
+        fixed += len(pairs)
+    return PresolveStats(timesteps=len(om.TIMESTEPS), deficit_steps=int(deficit.sum()),
+                         surplus_steps=int(surplus.sum()), fixed_variables=fixed, variables=variables)
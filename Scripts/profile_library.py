@@ -0,0 +1,293 @@
+"""
+Profile Library Module
+
+This module stores many PV and load profiles, e.g. PV feed-in per location,
+orientation and tilt and load profiles per household archetype, in one binary
+library: a single `.npy` array with one row per profile and a JSON index
+describing every row. The array is memory-mapped read-only, so looking up a
+profile neither parses a CSV file nor copies data, and all worker processes of
+a portfolio run share the same pages of memory.
+
+Profiles are addressed by a unique key or found by their attributes:
+
+    library = open_library("profiles.npy")
+    key = library.lookup("pv", location="Kassel", orientation="S", tilt=30)
+    pv = library.profile(key)
+
+The sizing engine uses a library passed as SizingEngine(library=...) for cases
+that name profiles with SizingParams.pv_profile_key and load_profile_key.
+
+The module contains the following components:
+- KIND_PV / KIND_LOAD: Kinds of profiles, in the units of the engine's profiles.
+- build_library: Write a library from profiles and their attributes.
+- build_from_manifest: Write a library from the CSV files listed in a manifest.
+- ProfileLibrary: Read-only, memory-mapped library with lookup by key and attributes.
+- open_library: Open a library once per process.
+
+Usage:
+1. Build the library: python profile_library.py build profiles.npy manifest.csv
+   The manifest has the columns key, kind, file and column, and any further
+   attribute columns (e.g. location, orientation, tilt, archetype).
+2. List its profiles: python profile_library.py list profiles.npy
+
+"""
+
+
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from result_cache import file_fingerprint
+
+
+# Kinds of profiles: PV feed-in in kW per kWp, load in kW per MWh of annual demand
+KIND_PV = "pv"
+KIND_LOAD = "load"
+KINDS = (KIND_PV, KIND_LOAD)
+
+LIBRARY_VERSION = 1
+# Columns of a manifest that are not attributes of the profile
+MANIFEST_COLUMNS = ('key', 'kind', 'file', 'column')
+
+
+def library_paths(path):
+    """Return the paths of the array and index file of a library given as .npy, .json or without suffix."""
+    base, suffix = os.path.splitext(path)
+    if suffix not in ('.npy', '.json'):
+        base = path
+    return base + ".npy", base + ".json"
+
+
+def build_library(path, profiles, timestep_hours=1.0, dtype=np.float32):
+    """
+    Write a profile library.
+
+    Parameters:
+    -----------
+        path: str
+            Array file of the library; the index is written next to it as .json.
+        profiles: iterable of tuple
+            (key, kind, values, attributes) of every profile; all profiles need
+            the same number of timesteps and `attributes` is a dict of JSON
+            values such as location, orientation, tilt or archetype.
+        timestep_hours: float
+            Length of the timesteps of all profiles.
+        dtype: numpy dtype
+            Data type of the stored profiles.
+
+    Returns:
+    --------
+        ProfileLibrary
+            The written library, memory-mapped.
+    """
+    array_path, index_path = library_paths(path)
+    entries, rows = [], []
+    for key, kind, values, attributes in profiles:
+        if kind not in KINDS:
+            raise ValueError(f"Unknown profile kind {kind!r} of {key!r}, expected one of {KINDS}")
+        if any(entry['key'] == key for entry in entries):
+            raise ValueError(f"Duplicate profile key {key!r}")
+        values = np.asarray(values, dtype=dtype)
+        if rows and len(values) != len(rows[0]):
+            raise ValueError(f"Profile {key!r} has {len(values)} timesteps, the others {len(rows[0])}")
+        if not np.isfinite(values).all():
+            raise ValueError(f"Profile {key!r} has missing or infinite values")
+        entries.append(dict(attributes or {}, key=key, kind=kind, row=len(rows)))
+        rows.append(values)
+    if not rows:
+        raise ValueError("A profile library needs at least one profile")
+
+    os.makedirs(os.path.dirname(os.path.abspath(array_path)), exist_ok=True)
+    tmp_path = f"{array_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.stack(rows))
+    os.replace(tmp_path, array_path)
+    index = {
+        'version': LIBRARY_VERSION,
+        'timesteps': len(rows[0]),
+        'timestep_hours': float(timestep_hours),
+        'dtype': np.dtype(dtype).name,
+        'sha256': file_fingerprint(array_path),
+        'profiles': entries,
+    }
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, index_path)
+    logging.info(f"Wrote {len(rows)} profiles of {len(rows[0])} timesteps to {array_path}")
+    return ProfileLibrary(array_path)
+
+
+def _attribute(text):
+    """Return a manifest value as number if it is one."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def build_from_manifest(path, manifest, timestep_hours=None):
+    """
+    Write a library from the CSV profiles listed in a manifest CSV file.
+
+    Every row names the key and kind of a profile, the CSV `file` (relative to
+    the manifest) and the `column` holding it; all further columns are stored
+    as attributes. The timestep length is taken from the timestamps of the
+    first profile file unless it is given.
+    """
+    from sizing_engine import profile_resolution
+    directory = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline='') as f:
+        rows = list(csv.DictReader(f))
+    missing = [name for name in MANIFEST_COLUMNS if rows and name not in rows[0]]
+    if missing:
+        raise ValueError(f"The manifest {manifest} lacks the columns {', '.join(missing)}")
+
+    def profiles():
+        for row in rows:
+            file = os.path.join(directory, row['file'])
+            values = pd.read_csv(file, usecols=[row['column']])[row['column']].to_numpy()
+            attributes = {name: _attribute(value) for name, value in row.items()
+                          if name not in MANIFEST_COLUMNS and value not in (None, '')}
+            yield row['key'], row['kind'], values, attributes
+
+    if timestep_hours is None and rows:
+        timestep_hours = profile_resolution(os.path.join(directory, rows[0]['file']))
+    return build_library(path, profiles(), timestep_hours=timestep_hours or 1.0)
+
+
+class ProfileLibrary:
+    """
+    A profile library, memory-mapped read-only.
+
+    The library can be pickled cheaply: only its path is sent to other
+    processes, which map the array file themselves.
+
+    Parameters:
+    -----------
+        path: str
+            Array file of the library (or its index file, or the path without suffix).
+    """
+
+    def __init__(self, path):
+        self.path, self.index_path = library_paths(path)
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if index.get('version') != LIBRARY_VERSION:
+            raise ValueError(f"{self.index_path} has library version {index.get('version')}, "
+                             f"expected {LIBRARY_VERSION}")
+        self.timesteps = index['timesteps']
+        self.timestep_hours = index['timestep_hours']
+        self.fingerprint = index['sha256']
+        self.entries = {entry['key']: entry for entry in index['profiles']}
+        self.array = np.load(self.path, mmap_mode='r')
+        if self.array.shape != (len(self.entries), self.timesteps):
+            raise ValueError(f"{self.path} holds an array of shape {self.array.shape}, the index describes "
+                             f"{len(self.entries)} profiles of {self.timesteps} timesteps")
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def keys(self, kind=None):
+        """Return the keys of all profiles, or of one kind."""
+        return [key for key, entry in self.entries.items() if kind is None or entry['kind'] == kind]
+
+    def find(self, kind=None, **attributes):
+        """Return the index entries of all profiles of `kind` (any if None) with the given attribute values."""
+        return [entry for entry in self.entries.values()
+                if (kind is None or entry['kind'] == kind)
+                and all(entry.get(name) == value for name, value in attributes.items())]
+
+    def lookup(self, kind, **attributes):
+        """
+        Return the key of the one profile of `kind` with the given attribute values.
+
+        Raises:
+        -------
+            KeyError
+                If no profile or more than one profile matches.
+        """
+        matches = self.find(kind, **attributes)
+        if len(matches) != 1:
+            described = ", ".join(f"{name}={value!r}" for name, value in attributes.items())
+            found = "No" if not matches else f"{len(matches)}"
+            raise KeyError(f"{found} {kind} profiles match {described or 'no attributes'}")
+        return matches[0]['key']
+
+    def profile(self, key, kind=None):
+        """
+        Return a profile as read-only array, a view of the memory-mapped library.
+
+        Parameters:
+        -----------
+            key: str
+                Key of the profile.
+            kind: str
+                Expected kind of the profile; raises a ValueError if it differs.
+        """
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            raise KeyError(f"The profile library {self.path} has no profile {key!r}") from None
+        if kind is not None and entry['kind'] != kind:
+            raise ValueError(f"Profile {key!r} is a {entry['kind']} profile, not a {kind} profile")
+        return self.array[entry['row']]
+
+
+_libraries = {}
+
+
+def open_library(path):
+    """Return the library at `path`, opened once per process and reopened when its files change."""
+    array_path, index_path = library_paths(path)
+    stat = os.stat(array_path)
+    stamp = (stat.st_size, stat.st_mtime_ns, os.stat(index_path).st_mtime_ns)
+    key = os.path.abspath(array_path)
+    cached = _libraries.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = _libraries[key] = (stamp, ProfileLibrary(array_path))
+    return cached[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or list a profile library.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build a library from the CSV profiles of a manifest")
+    build.add_argument("library", help="array file of the library (.npy)")
+    build.add_argument("manifest", help="CSV file with the columns key, kind, file, column and attributes")
+    build.add_argument("--timestep-hours", type=float, help="timestep length, read from the profiles by default")
+    listing = subparsers.add_parser("list", help="list the profiles of a library")
+    listing.add_argument("library", help="array file of the library (.npy)")
+    listing.add_argument("--kind", choices=KINDS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "build":
+        library = build_from_manifest(args.library, args.manifest, args.timestep_hours)
+    else:
+        library = ProfileLibrary(args.library)
+    print(f"{len(library)} profiles of {library.timesteps} timesteps of {library.timestep_hours:g} h")
+    if args.command == "list":
+        for key in library.keys(args.kind):
+            entry = library.entries[key]
+            attributes = ", ".join(f"{name}={value}" for name, value in entry.items()
+                                   if name not in ('key', 'kind', 'row'))
+            print(f"{key}\t{entry['kind']}\t{attributes}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
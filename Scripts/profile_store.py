@@ -0,0 +1,142 @@
+"""
+Profile Store Module
+
+This module keeps the parsed input profiles of the EcoSizer as binary NumPy
+sidecar files next to the CSV files they were read from. A profile column is
+parsed from CSV only once; afterwards it is memory-mapped from its `.npy`
+sidecar, which is rebuilt only when the CSV file changes. Because the sidecars
+are mapped read-only, all worker processes of a batch run share the same pages
+of memory instead of each holding a parsed copy.
+
+The module contains the following components:
+- ProfileStore: Loads profile columns once per process from memory-mapped sidecars.
+- load_profile_column: Convenience function using a shared default store.
+
+Usage:
+1. Call load_profile_column("Input_Files/Scaled_LP_H0.csv", "h0").
+2. The returned array is read-only; copy it before modifying it.
+
+"""
+
+
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from result_cache import file_fingerprint
+
+
+SIDECAR_DIR = ".profile_cache"
+
+
+class ProfileStore:
+    """
+    Store of parsed profile columns backed by memory-mapped `.npy` sidecars.
+
+    A sidecar is valid as long as size and modification time of its CSV file
+    are unchanged. If only the modification time changed, the content hash
+    decides whether the CSV has to be parsed again. Loaded columns are kept for
+    the lifetime of the store, so repeated calls cost one `os.stat`.
+
+    Parameters:
+    -----------
+        sidecar_dir: str
+            Directory for the sidecars; defaults to a `.profile_cache` directory
+            next to each CSV file.
+        dtype: numpy dtype
+            Data type of the stored profiles.
+    """
+
+    def __init__(self, sidecar_dir=None, dtype=np.float64):
+        self.sidecar_dir = sidecar_dir
+        self.dtype = np.dtype(dtype)
+        self._columns = {}
+
+    def sidecar_path(self, csv_path, column):
+        """Return the path of the `.npy` sidecar of a profile column."""
+        directory = self.sidecar_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), SIDECAR_DIR)
+        name = f"{os.path.basename(csv_path)}.{column}.{self.dtype.name}.npy"
+        return os.path.join(directory, name)
+
+    def load(self, csv_path, column):
+        """
+        Return a profile column as a read-only NumPy array.
+
+        Parameters:
+        -----------
+            csv_path: str
+                CSV file holding the profile.
+            column: str
+                Name of the profile column.
+        """
+        stat = os.stat(csv_path)
+        stamp = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        key = (os.path.abspath(csv_path), column)
+        cached = self._columns.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        array = self._load_sidecar(csv_path, column, stamp)
+        if array is None:
+            array = self._build_sidecar(csv_path, column, stamp)
+        self._columns[key] = (stamp, array)
+        return array
+
+    # Sidecar files
+    #==============#
+    def _load_sidecar(self, csv_path, column, stamp):
+        """Map a valid sidecar, or return None if it is missing or outdated."""
+        path = self.sidecar_path(csv_path, column)
+        try:
+            with open(path + ".json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if {k: meta.get(k) for k in stamp} != stamp:
+            # Touched but possibly unchanged file: compare the content
+            if meta.get('sha256') != file_fingerprint(csv_path):
+                return None
+            meta.update(stamp)
+            self._write_meta(path, meta)
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def _build_sidecar(self, csv_path, column, stamp):
+        """Parse a profile column from CSV and write its sidecar."""
+        logging.info(f"Parsing profile column {column!r} of {csv_path}")
+        array = pd.read_csv(csv_path, usecols=[column])[column].to_numpy(dtype=self.dtype)
+        path = self.sidecar_path(csv_path, column)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+            self._write_meta(path, dict(stamp, sha256=file_fingerprint(csv_path), column=column))
+        except OSError as e:  # e.g. read-only installation, keep the parsed array in memory
+            logging.debug(f"Could not write profile sidecar {path}: {e}")
+            array.flags.writeable = False
+            return array
+        return np.load(path, mmap_mode='r')
+
+    @staticmethod
+    def _write_meta(path, meta):
+        tmp_path = f"{path}.json.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path + ".json")
+
+
+_default_store = None
+
+
+def load_profile_column(csv_path, column):
+    """Load a profile column with the shared default store of this process."""
+    global _default_store
+    if _default_store is None:
+        _default_store = ProfileStore()
+    return _default_store.load(csv_path, column)
@@ -0,0 +1,172 @@
+"""
+Result Cache Module
+
+This module provides a persistent, content-addressed cache for sizing results.
+A result is stored under a hash of all inputs of the sizing case: the SizingParams,
+the solver and its options and a fingerprint of the load and PV profile files.
+Sizing the same case again returns the stored capacities, bus sequences and KPIs
+without solving. The entries of every profile fingerprint are kept in their own
+subdirectory, so engines reading different input directories can share a cache.
+
+The module contains the following components:
+- file_fingerprint: Content hash of a profile file, memoised on size and mtime.
+- ResultCache: On-disk cache with size-bounded LRU eviction.
+
+Usage:
+1. Create a ResultCache and pass it to the SizingEngine: SizingEngine(cache=ResultCache()).
+2. Entries are invalidated automatically when the profile files of an engine change.
+
+"""
+
+
+import os
+import json
+import pickle
+import hashlib
+import logging
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".ecosizer", "cache")
+DEFAULT_MAX_BYTES = 500 * 1024**2
+CACHE_VERSION = 6  # bump when the layout of SizingResult or of the cache directory changes
+
+_fingerprints = {}
+
+
+def file_fingerprint(path):
+    """
+    Return the SHA-256 hash of a file's content.
+
+    The hash is memoised on (path, size, mtime), so it is only recomputed when
+    the file has been modified.
+    """
+    stat = os.stat(path)
+    stamp = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if _fingerprints.get(stamp[0], (None,))[0] != stamp:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _fingerprints[stamp[0]] = (stamp, digest.hexdigest())
+    return _fingerprints[stamp[0]][1]
+
+
+def profiles_fingerprint(paths):
+    """Return a combined fingerprint of several profile files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_fingerprint(path).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of SizingResult objects with size-bounded LRU eviction.
+
+    Every entry is one pickle file named after the hash of the case, in the
+    subdirectory of its profile fingerprint. The file modification time is
+    refreshed on every hit and the least recently used entries of all
+    fingerprints are removed once the cache grows beyond `max_bytes`.
+    invalidate() drops the entries of one fingerprint, e.g. when the profile
+    files it was computed from have changed.
+
+    Parameters:
+    -----------
+        cache_dir: str
+            Directory holding the cache entries.
+        max_bytes: int
+            Upper bound for the total size of all entries.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, params, profiles, solver=""):
+        """Return the cache key of a sizing case."""
+        payload = json.dumps({'version': CACHE_VERSION, 'params': params.to_dict(), 'solver': solver},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _directory(self, profiles):
+        return os.path.join(self.cache_dir, profiles[:16])
+
+    def _path(self, params, profiles, solver):
+        return os.path.join(self._directory(profiles), self.key(params, profiles, solver) + ".pkl")
+
+    def _entries(self):
+        """Return (path, size, mtime) of all cache entries."""
+        entries = []
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:  # removed by another process
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def invalidate(self, profiles):
+        """Remove all entries computed with the given profile fingerprint."""
+        directory = self._directory(profiles)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(".pkl"):
+                    self._remove(os.path.join(directory, name))
+            try:
+                os.rmdir(directory)
+            except OSError:  # written to by another process meanwhile
+                pass
+
+    def get(self, params, profiles, solver=""):
+        """Return the cached SizingResult of a case, or None."""
+        path = self._path(params, profiles, solver)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        os.utime(path)  # mark as recently used
+        self.hits += 1
+        return result
+
+    def put(self, params, profiles, result, solver=""):
+        """Store the SizingResult of a case and evict old entries if necessary."""
+        path = self._path(params, profiles, solver)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # atomic, readers never see partial entries
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits into max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove all entries."""
+        for path, _, _ in self._entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        else:
+            logging.debug(f"Removed cache entry {path}")
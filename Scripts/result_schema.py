@@ -0,0 +1,177 @@
+"""
+Result Schema Module
+
+This module maps the flows of a solved EcoSizer model to the named result
+sequences by the labels of their source and target nodes, instead of relying on
+the order in which solph emits them. The mapping is checked on every case: all
+flows of the schema must exist, no other flow may touch the electricity bus and
+the values must be complete, non-negative and balance at the bus in every
+timestep. A case that does not fit the schema raises a ResultSchemaError, so a
+renamed component or a changed oemof version can not silently mislabel results.
+
+The module contains the following components:
+- FlowSpec / FLOW_SCHEMA: Name, source label and target label of every sequence.
+- SEQUENCE_COLUMNS: The sequence names in schema order.
+- ResultSchemaError: A model or its results do not match the schema.
+- BusFlows: Typed record of the validated flows around the electricity bus.
+- flows_from_model / flows_from_results: Read BusFlows from a solved model or
+  from the complete solph results.
+
+Usage:
+1. Call flows_from_model(om) after solving, or BusFlows.from_frame(sequences)
+   to check stored sequences, and use to_frame() for a DataFrame.
+
+"""
+
+
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+
+BUS_LABEL = "electricity"
+
+
+@dataclass(frozen=True)
+class FlowSpec:
+    """A result sequence and the labels of the source and target node of its flow."""
+    name: str
+    source: str
+    target: str
+
+
+FLOW_SCHEMA = (
+    FlowSpec('demand', BUS_LABEL, 'demand'),
+    FlowSpec('grid_feed_in', BUS_LABEL, 'grid_feed_in'),
+    FlowSpec('storage_in', BUS_LABEL, 'storage'),
+    FlowSpec('grid_supply', 'grid_supply', BUS_LABEL),
+    FlowSpec('Pv_feed_in', 'pv', BUS_LABEL),
+    FlowSpec('storage_out', 'storage', BUS_LABEL),
+)
+SEQUENCE_COLUMNS = [spec.name for spec in FLOW_SCHEMA]
+
+# Absolute tolerance (kW) of the bus balance and of negative flow values
+TOLERANCE = 1e-5
+
+
+class ResultSchemaError(ValueError):
+    """The flows of a model or its results do not match FLOW_SCHEMA."""
+
+
+@dataclass(frozen=True)
+class BusFlows:
+    """
+    Flows around the electricity bus in kW per timestep, as float32 arrays.
+
+    Every field is named after its FlowSpec; `index` holds the timestamps of
+    the timesteps.
+    """
+    index: pd.Index
+    demand: np.ndarray
+    grid_feed_in: np.ndarray
+    storage_in: np.ndarray
+    grid_supply: np.ndarray
+    Pv_feed_in: np.ndarray
+    storage_out: np.ndarray
+
+    @classmethod
+    def from_columns(cls, index, columns):
+        """Create the record from a mapping of sequence names to values and validate it."""
+        missing = [name for name in SEQUENCE_COLUMNS if name not in columns]
+        if missing:
+            raise ResultSchemaError(f"Missing sequences: {', '.join(missing)}")
+        flows = cls(index=index, **{name: np.asarray(columns[name], dtype=np.float32) for name in SEQUENCE_COLUMNS})
+        flows.validate()
+        return flows
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Create the record from a sequences DataFrame, e.g. SizingResult.sequences, and validate it."""
+        return cls.from_columns(frame.index, {name: frame[name].to_numpy() for name in frame.columns})
+
+    def columns(self):
+        """Return the sequences as dictionary in schema order."""
+        return {name: getattr(self, name) for name in SEQUENCE_COLUMNS}
+
+    def to_frame(self):
+        """Return the sequences as DataFrame with the columns of SEQUENCE_COLUMNS."""
+        return pd.DataFrame(self.columns(), index=self.index)
+
+    def validate(self, tolerance=TOLERANCE):
+        """
+        Check lengths, values and the bus balance.
+
+        Raises:
+        -------
+            ResultSchemaError
+                With all problems found.
+        """
+        problems = []
+        columns = self.columns()
+        for name, values in columns.items():
+            if values.ndim != 1 or len(values) != len(self.index):
+                problems.append(f"{name} has shape {values.shape}, expected ({len(self.index)},)")
+            elif not np.isfinite(values).all():
+                problems.append(f"{name} has {int((~np.isfinite(values)).sum())} missing or infinite values")
+            elif len(values) and values.min() < -tolerance:
+                problems.append(f"{name} is negative down to {values.min():g} kW")
+        if not problems and len(self.index):
+            inflow = (columns['grid_supply'].astype(np.float64) + columns['Pv_feed_in'] + columns['storage_out'])
+            outflow = (columns['demand'].astype(np.float64) + columns['grid_feed_in'] + columns['storage_in'])
+            # float32 sequences carry about 7 significant digits
+            allowed = tolerance + 1e-6 * np.maximum(inflow, outflow)
+            violation = np.abs(inflow - outflow) - allowed
+            if violation.max() > 0:
+                step = int(violation.argmax())
+                problems.append(f"The bus is not balanced at timestep {step}: "
+                                f"{inflow[step]:g} kW in, {outflow[step]:g} kW out")
+        if problems:
+            raise ResultSchemaError("; ".join(problems))
+
+
+def _label(node):
+    return str(node.label)
+
+
+def _match(pairs):
+    """
+    Return the schema name of every (source, target) node pair at the bus.
+
+    Raises a ResultSchemaError if a flow of the schema is missing or the bus has
+    flows the schema does not know.
+    """
+    by_labels = {(_label(source), _label(target)): (source, target) for source, target in pairs}
+    missing = [f"{spec.name} ({spec.source} -> {spec.target})" for spec in FLOW_SCHEMA
+               if (spec.source, spec.target) not in by_labels]
+    known = {(spec.source, spec.target) for spec in FLOW_SCHEMA}
+    unexpected = [f"{source} -> {target}" for source, target in by_labels
+                  if BUS_LABEL in (source, target) and (source, target) not in known]
+    if missing or unexpected:
+        raise ResultSchemaError(
+            "The flows do not match the result schema"
+            + (f"; missing: {', '.join(missing)}" if missing else "")
+            + (f"; not in the schema: {', '.join(unexpected)}" if unexpected else ""))
+    return {spec.name: by_labels[(spec.source, spec.target)] for spec in FLOW_SCHEMA}
+
+
+def flows_from_model(om):
+    """Read the validated bus flows straight from the flow variables of a solved solph model."""
+    steps = len(om.TIMESTEPS)
+    flow = om.flow
+    columns = {
+        name: np.fromiter((flow[source, target, p, t].value for p, t in om.TIMEINDEX), dtype=np.float64,
+                          count=len(om.TIMEINDEX))
+        for name, (source, target) in _match(om.FLOWS).items()}
+    return BusFlows.from_columns(om.es.timeindex[:steps], columns)
+
+
+def flows_from_results(results, steps):
+    """Read the validated bus flows of the first `steps` timesteps from solph.processing.results."""
+    pairs = [key for key in results if key[1] is not None]
+    columns = {}
+    index = None
+    for name, key in _match(pairs).items():
+        sequence = results[key]['sequences']['flow']
+        columns[name] = sequence.to_numpy()[:steps]
+        index = sequence.index[:steps]
+    return BusFlows.from_columns(index, columns)
@@ -0,0 +1,237 @@
+"""
+Results Writer Module
+
+This module streams the results of batch sizing runs to files while the run is
+still going. Rows are appended as the cases complete, so an interrupted run keeps
+everything solved so far and can be resumed, and the files can be read at any
+time.
+
+The module contains the following components:
+- CsvResultsWriter: One CSV file with the scalar results of every case.
+- ParquetResultsWriter: Columnar Parquet dataset of the scalar results and,
+  optionally, the flows around the electricity bus of every case. Needs pyarrow.
+- open_results_writer: Chooses the writer from the file name.
+
+Usage:
+1. Open a writer with the columns of the results table and call write() for
+   every case, then close() it (or use it as context manager).
+2. A Parquet dataset is read with pandas.read_parquet("<dir>/kpis") or
+   pyarrow.dataset.dataset("<dir>/sequences"), also while it is being written.
+
+"""
+
+
+import os
+import csv
+import time
+import logging
+import numpy as np
+from result_schema import SEQUENCE_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for Parquet output
+    pa = pq = None
+
+
+class CsvResultsWriter:
+    """
+    Appends result rows to a CSV file, flushing after every row.
+
+    Parameters:
+    -----------
+        path: str
+            CSV file; created with a header row if it does not exist.
+        columns: list of str
+            Column names, the first one being the case index.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(self.columns)
+            self._file.flush()
+
+    @staticmethod
+    def completed_indices(path):
+        """
+        Return the indices of the cases already stored in a results file.
+
+        A last row that was cut off by a crash is removed from the file, so that
+        the case is solved again and the file stays valid CSV.
+        """
+        if not os.path.exists(path):
+            return set()
+        with open(path, 'rb+') as f:
+            content = f.read()
+            if content and not content.endswith(b'\n'):
+                f.truncate(content.rfind(b'\n') + 1)
+        with open(path, newline='') as f:
+            return {int(row['index']) for row in csv.DictReader(f) if row.get('status')}
+
+    def write(self, row, sequences=None):
+        """Append one row given as dictionary of column values; sequences are not stored in CSV."""
+        self._writer.writerow([row.get(name, '') for name in self.columns])
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetResultsWriter:
+    """
+    Streams result rows to a directory of Parquet part files.
+
+    Rows are buffered and written as a new part file of `<directory>/kpis` once
+    `buffer_rows` rows have been collected or `flush_interval` seconds have
+    passed, so memory stays bounded and readers see new results regularly. With
+    `sequences=True` the bus flows of every case (float32, one row per case and
+    timestep) are written the same way to `<directory>/sequences`, at most
+    `buffer_steps` rows at a time. Part files are never modified after they were
+    written: every part is written under a hidden name and renamed when it is
+    complete, which dataset readers ignore until then. The sequences of a flush
+    are written before its rows, so a case counts as completed only once its
+    sequences are stored; after a crash between the two, the cases of the lost
+    rows are solved again on resume and their sequences appear twice.
+
+    Parameters:
+    -----------
+        directory: str
+            Directory of the dataset; existing parts are kept and appended to.
+        columns: list of str
+            Column names; "index" is stored as integer, the TEXT_COLUMNS (status,
+            error, mode and the profile library keys) as text, all others as floats.
+        sequences: bool
+            Also store the bus flow sequences of every case.
+    """
+
+    TEXT_COLUMNS = ('status', 'error', 'mode', 'pv_profile_key', 'load_profile_key')
+
+    def __init__(self, directory, columns, sequences=False, buffer_rows=1000, buffer_steps=2_000_000,
+                 flush_interval=30):
+        if pa is None:
+            raise ImportError("Parquet results need pyarrow: pip install pyarrow")
+        self.directory = directory
+        self.columns = list(columns)
+        self.sequences = sequences
+        self.buffer_rows = buffer_rows
+        self.buffer_steps = buffer_steps
+        self.flush_interval = flush_interval
+        self.schema = pa.schema([
+            (name, pa.int64() if name == 'index' else pa.string() if name in self.TEXT_COLUMNS else pa.float64())
+            for name in self.columns])
+        self.sequence_schema = pa.schema(
+            [('index', pa.int64()), ('timestep', pa.int32())] + [(name, pa.float32()) for name in SEQUENCE_COLUMNS])
+        self._rows = []
+        self._steps = []
+        self._buffered_steps = 0
+        self._last_flush = time.monotonic()
+        self._parts = {}
+        for table in ('kpis', 'sequences'):
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+            self._parts[table] = self._next_part(table)
+
+    @staticmethod
+    def completed_indices(directory):
+        """Return the indices of the cases already stored in a dataset."""
+        kpis = os.path.join(directory, 'kpis')
+        if pq is None or not os.path.isdir(kpis) or not _part_files(kpis):
+            return set()
+        return set(pq.read_table(kpis, columns=['index']).column('index').to_pylist())
+
+    def _next_part(self, table):
+        parts = _part_files(os.path.join(self.directory, table))
+        return max((int(name[5:10]) for name in parts), default=-1) + 1
+
+    def write(self, row, sequences=None):
+        """
+        Buffer one row given as dictionary of column values.
+
+        `sequences` are the bus flows of the case as array or DataFrame with the
+        columns of result_schema.SEQUENCE_COLUMNS.
+        """
+        self._rows.append(row)
+        if self.sequences and sequences is not None:
+            values = np.asarray(sequences, dtype=np.float32)
+            self._steps.append((row['index'], values))
+            self._buffered_steps += len(values)
+        if (len(self._rows) >= self.buffer_rows or self._buffered_steps >= self.buffer_steps
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write the buffered sequences and rows as new part files, the rows last."""
+        if self._steps:
+            data = {
+                'index': np.concatenate([np.full(len(values), index) for index, values in self._steps]),
+                'timestep': np.concatenate([np.arange(len(values), dtype=np.int32) for _, values in self._steps]),
+            }
+            stacked = np.concatenate([values for _, values in self._steps])
+            for i, name in enumerate(SEQUENCE_COLUMNS):
+                data[name] = stacked[:, i]
+            self._write_part('sequences', pa.Table.from_pydict(data, schema=self.sequence_schema))
+            self._steps = []
+            self._buffered_steps = 0
+        if self._rows:
+            data = {name: [row.get(name) for row in self._rows] for name in self.columns}
+            for name in self.columns:
+                if name not in self.TEXT_COLUMNS and name != 'index':
+                    data[name] = [np.nan if value in ('', None) else value for value in data[name]]
+            self._write_part('kpis', pa.Table.from_pydict(data, schema=self.schema))
+            self._rows = []
+        self._last_flush = time.monotonic()
+
+    def _write_part(self, table, data):
+        name = f"part-{self._parts[table]:05d}.parquet"
+        self._parts[table] += 1
+        path = os.path.join(self.directory, table, name)
+        tmp_path = os.path.join(self.directory, table, f".{name}.{os.getpid()}.tmp")
+        pq.write_table(data, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+        logging.debug(f"Wrote {data.num_rows} rows to {path}")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _part_files(directory):
+    return [name for name in os.listdir(directory) if name.startswith('part-') and name.endswith('.parquet')]
+
+
+def open_results_writer(path, columns, sequences=False):
+    """
+    Open the writer matching a results path.
+
+    Paths ending in ".csv" get a CsvResultsWriter, all others are treated as the
+    directory of a Parquet dataset. Sequences can only be stored in Parquet
+    datasets; asking for them with a CSV path raises a ValueError.
+    """
+    if path.endswith('.csv'):
+        if sequences:
+            raise ValueError(f"Sequences are only stored in Parquet results, not in the CSV file {path}")
+        return CsvResultsWriter(path, columns)
+    return ParquetResultsWriter(path, columns, sequences=sequences)
+
+
+def completed_indices(path):
+    """Return the indices of the cases already stored under a results path."""
+    if path.endswith('.csv'):
+        return CsvResultsWriter.completed_indices(path)
+    return ParquetResultsWriter.completed_indices(path)
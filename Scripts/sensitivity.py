@@ -0,0 +1,179 @@
+"""
+Sensitivity Module
+
+This module analyses how the optimal sizing of a case reacts to its inputs.
+The case is solved once on a PersistentModel; every variation only updates the
+cost coefficients of that model and re-solves it. With the HiGHS backend the
+solver keeps the model and restarts from the previous optimal basis, so a nudge
+of one slider costs a fraction of a full solve.
+
+Besides the tornado-style sensitivities of the PV and storage capacity and the
+payback to every input, the first-order sensitivities come from the base solve
+itself when the solver reports dual values: the reduced costs of the investment
+variables and the marginal cost of the annual demand.
+
+The module contains the following components:
+- DEFAULT_DELTAS: Variation of every input, one slider step of the GUIs.
+- SensitivityResult: Base result, marginal values and tornado table.
+- SensitivityAnalysis: Re-solves variations of a case on one warm model.
+
+Usage:
+1. Create SensitivityAnalysis(engine, params).
+2. Call tornado() for all inputs, or solve(params) for single variations.
+
+"""
+
+
+import time
+import logging
+from dataclasses import dataclass, replace
+import pandas as pd
+from oemof.tools import economics
+from sizing_engine import PersistentModel, MODE_PV_BESS
+from finance import analyse_results
+
+
+# Variation of the inputs, one slider step of the GUIs
+DEFAULT_DELTAS = {
+    'pv_capex': 100,          # €/kWp
+    'bess_capex': 100,        # €/kWh
+    'electricity_price': 1,   # €-cents/kWh
+    'feedin_price': 1,        # €-cents/kWh
+    'annual_demand': 500,     # kWh/Yr
+}
+
+
+@dataclass
+class SensitivityResult:
+    """
+    Sensitivities of one sizing case.
+
+    `marginals` holds the first-order values from the base solve (None if the
+    solver does not report duals):
+    - storage_reduced_cost / pv_reduced_cost: change of the annual cost (€/Yr)
+      per kWh or kWp forced into the solution; positive at zero capacity,
+      negative for PV at its upper limit.
+    - bess_capex_break_even / pv_capex_break_even: CAPEX at which a capacity
+      that is zero would start to be built.
+    - demand_marginal_cost: change of the annual cost per kWh/Yr of demand.
+    `tornado` has one row per input with the low and high values and the
+    resulting capacities and paybacks, sorted by the payback swing.
+    """
+    base: object
+    base_payback: float
+    marginals: dict
+    tornado: pd.DataFrame
+    warm_start: bool
+    solve_times: list
+
+
+class SensitivityAnalysis:
+    """
+    Solves variations of one sizing case on a single warm model.
+
+    Parameters:
+    -----------
+        engine: SizingEngine
+            Engine providing profiles and solver; the HiGHS backend warm starts.
+        params: SizingParams
+            Base case. Variations may change all inputs that do not change the
+            model structure (prices, CAPEX, demand, lifetimes, WACC, PV size).
+    """
+
+    def __init__(self, engine, params):
+        self.engine = engine
+        self.params = params
+        self.model = PersistentModel(engine, params, duals=True)
+        self.solve_times = []
+        self.base = self.solve(params)
+        self.marginals = self._marginals()
+
+    def solve(self, params):
+        """Re-solve the model for a variation of the base case and return its SizingResult."""
+        om = self.model.update(params)
+        start = time.perf_counter()
+        self.engine.solve_model(om)
+        self.solve_times.append(time.perf_counter() - start)
+        return self.engine.process_results(params, om, self.model.components)
+
+    def _marginals(self):
+        """Read reduced costs and duals of the base solve, if the solver reported them."""
+        om, params = self.model.om, self.params
+        marginals = dict.fromkeys(['storage_reduced_cost', 'pv_reduced_cost', 'bess_capex_break_even',
+                                   'pv_capex_break_even', 'demand_marginal_cost'])
+        if not len(om.rc) and not len(om.dual):
+            logging.info("The solver reported no duals, marginal values are not available")
+            return marginals
+
+        def reduced_cost(variables):
+            values = [om.rc.get(var) for var in variables]
+            return None if any(value is None for value in values) else sum(values)
+
+        def break_even(rc, capacity, capex, lifetime):
+            # A capacity at zero is built once its annuity drops by the reduced cost
+            if rc is None or capacity > 1e-6 or rc <= 0:
+                return None
+            factor = economics.annuity(capex=1, n=lifetime, wacc=params.wacc) * self.model.years
+            return capex - rc / factor
+
+        marginals['storage_reduced_cost'] = reduced_cost(self.model.storage_invest)
+        marginals['bess_capex_break_even'] = break_even(
+            marginals['storage_reduced_cost'], self.base.storage_capacity, params.bess_capex, params.bess_lifetime)
+        if params.mode == MODE_PV_BESS:
+            marginals['pv_reduced_cost'] = reduced_cost(self.model.pv_invest)
+            marginals['pv_capex_break_even'] = break_even(
+                marginals['pv_reduced_cost'], self.base.pv_capacity, params.pv_capex, params.pv_lifetime)
+
+        # The demand enters through the fixed demand flows, scaled by ecosizer_demand (MWh/Yr)
+        constraint = om.find_component(f"ecosizer_fix_{self.model.components['demand'].label}")
+        duals = [om.dual.get(constraint[index]) for index in constraint]
+        if duals and all(dual is not None for dual in duals):
+            profile = self.engine.load_profile.to_numpy()
+            total = sum(dual * profile[t] for dual, (p, t) in zip(duals, constraint))
+            marginals['demand_marginal_cost'] = total / 1000 / self.model.years
+        return marginals
+
+    def tornado(self, deltas=None):
+        """
+        Vary every input by -delta and +delta and collect the capacities and paybacks.
+
+        Parameters:
+        -----------
+            deltas: dict
+                SizingParams field names mapped to the absolute variation;
+                DEFAULT_DELTAS by default. Values are kept non-negative.
+
+        Returns:
+        --------
+            SensitivityResult
+        """
+        deltas = DEFAULT_DELTAS if deltas is None else deltas
+        variations, results = [], []
+        for name, delta in deltas.items():
+            value = getattr(self.params, name)
+            for side, varied in (('low', max(value - delta, 0)), ('high', value + delta)):
+                variations.append((name, side, varied))
+                results.append(self.solve(replace(self.params, **{name: varied})))
+                logging.debug(f"Sensitivity {name}={varied}: {results[-1].kpis()}")
+
+        paybacks = analyse_results([self.base] + results).simple_payback
+        rows = {}
+        for (name, side, varied), result, payback in zip(variations, results, paybacks[1:]):
+            row = rows.setdefault(name, {'input': name, 'base': getattr(self.params, name)})
+            row[side] = varied
+            row[f'pv_capacity_{side}'] = result.pv_capacity
+            row[f'storage_capacity_{side}'] = result.storage_capacity
+            row[f'payback_{side}'] = payback
+        tornado = pd.DataFrame(list(rows.values()))
+        if len(tornado):
+            swing = (tornado['payback_high'] - tornado['payback_low']).abs()
+            tornado = tornado.loc[swing.sort_values(ascending=False).index].reset_index(drop=True)
+
+        return SensitivityResult(
+            base=self.base,
+            base_payback=float(paybacks[0]),
+            marginals=self.marginals,
+            tornado=tornado,
+            warm_start=self.engine.solver_backend.warm_starts(),
+            solve_times=list(self.solve_times),
+        )
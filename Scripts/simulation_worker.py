@@ -0,0 +1,205 @@
+"""
+Simulation Worker Module
+
+This module runs the sizing optimisation of the EcoSizer GUIs off the Qt GUI
+thread. Scenarios are queued on a SimulationWorker thread, which hands them to a
+separate solver process and relays its progress back to the window through Qt
+signals. Cancelling a scenario kills the solver process (on Linux and macOS
+together with the LP solver it started); a fresh process is started for the
+next scenario.
+
+The module contains the following components:
+- SimulationWorker: QThread that queues scenarios and emits progress, result,
+  failure and cancellation signals.
+
+Usage:
+1. Create a SimulationWorker, connect its signals to the window and start() it.
+2. Call submit(params) for every scenario and cancel() to stop the running one.
+
+"""
+
+
+import os
+import sys
+import queue
+import signal
+import logging
+import multiprocessing
+from PyQt5 import QtCore
+
+
+def _serve(tasks, events, engine_kwargs):
+    """
+    Main function of the solver process.
+
+    Sizes the scenarios received on `tasks` one after another and reports every
+    stage, the result or the error on `events`. None on `tasks` ends the process.
+    If the engine can not be set up (missing input files or solver), the error
+    is reported for every scenario instead of ending the process.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()  # own process group, so cancelling also stops the LP solver started by pyomo
+    from sizing_engine import SizingEngine
+    from telemetry import Telemetry
+    telemetry = Telemetry(callbacks=[lambda event: events.put(("telemetry", event))])
+    try:
+        engine = SizingEngine(**engine_kwargs, telemetry=telemetry)
+        setup_error = None
+    except Exception as e:
+        engine, setup_error = None, f"Engine setup failed: {type(e).__name__}: {e}"
+    while True:
+        params = tasks.get()
+        if params is None:
+            break
+        if setup_error is not None:
+            events.put(("error", setup_error))
+            continue
+        try:
+            result = engine.size(params, progress=lambda stage: events.put(("stage", stage)))
+        except Exception as e:
+            events.put(("error", f"{type(e).__name__}: {e}"))
+        else:
+            events.put(("result", result))
+
+
+class SimulationWorker(QtCore.QThread):
+    """
+    Thread running queued sizing scenarios in a solver process.
+
+    Signals:
+    --------
+        stage(object, str): A scenario entered a stage (see sizing_engine.STAGES).
+        finished_case(object, object): A scenario was sized; params and SizingResult.
+        failed(object, str): A scenario failed; params and error message.
+        cancelled(object): A scenario was cancelled.
+        telemetry(object): A stage of the solver process ended; telemetry.StageEvent.
+
+    Parameters:
+    -----------
+        engine_kwargs: dict
+            Arguments for the SizingEngine of the solver process.
+    """
+    stage = QtCore.pyqtSignal(object, str)
+    finished_case = QtCore.pyqtSignal(object, object)
+    failed = QtCore.pyqtSignal(object, str)
+    cancelled = QtCore.pyqtSignal(object)
+    telemetry = QtCore.pyqtSignal(object)
+
+    POLL_INTERVAL = 0.1  # seconds between checks for cancellation while solving
+
+    def __init__(self, engine_kwargs=None, parent=None):
+        super().__init__(parent)
+        self.engine_kwargs = engine_kwargs or {}
+        self._pending = queue.Queue()
+        # Incremented by cancel(); scenarios submitted before are cancelled whenever they are dequeued
+        self._generation = 0
+        self._stop = False
+        self._process = None
+        self._tasks = None
+        self._events = None
+
+    # Called from the GUI thread
+    #===========================#
+    def submit(self, params):
+        """Queue a scenario; it is sized after all scenarios submitted before it."""
+        self._pending.put((self._generation, params))
+
+    def cancel(self):
+        """Cancel the running scenario and drop all queued ones."""
+        self._generation += 1
+        while True:
+            try:
+                item = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self.cancelled.emit(item[1])
+
+    def stop(self):
+        """Cancel everything and end the thread; waits until it has finished."""
+        self._stop = True
+        self.cancel()
+        self._pending.put(None)
+        self.wait()
+
+    # Worker thread
+    #==============#
+    def run(self):
+        # Start the solver process right away: it imports the sizing engine (oemof,
+        # pyomo, pandas) while the window is already usable, not on the first Run
+        try:
+            self._ensure_process()
+        except Exception as e:  # retried with the first scenario, which reports the error
+            logging.warning(f"Could not start the solver process: {e}")
+            self._process = None
+        while not self._stop:
+            item = self._pending.get()
+            if item is None:
+                break
+            self._run_case(*item)
+        self._shutdown_process()
+
+    def _ensure_process(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        context = multiprocessing.get_context("spawn")  # no forked Qt state in the child
+        self._tasks, self._events = context.Queue(), context.Queue()
+        self._process = context.Process(target=_serve, args=(self._tasks, self._events, self.engine_kwargs),
+                                        daemon=True)
+        self._process.start()
+
+    def _run_case(self, generation, params):
+        if generation != self._generation:  # cancelled after it was taken from the queue
+            self.cancelled.emit(params)
+            return
+        try:
+            self._ensure_process()
+        except Exception as e:
+            self._process = None
+            self.failed.emit(params, f"Could not start the solver process: {e}")
+            return
+        self._tasks.put(params)
+        while True:
+            if generation != self._generation:
+                self._kill_process()
+                self.cancelled.emit(params)
+                return
+            try:
+                kind, payload = self._events.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._process = None
+                    self.failed.emit(params, "Solver process ended unexpectedly")
+                    return
+                continue
+            if kind == "stage":
+                self.stage.emit(params, payload)
+            elif kind == "telemetry":
+                self.telemetry.emit(payload)
+            elif kind == "result":
+                self.finished_case.emit(params, payload)
+                return
+            else:
+                self.failed.emit(params, payload)
+                return
+
+    def _kill_process(self):
+        """Kill the solver process and the LP solver it may have started."""
+        process, self._process = self._process, None
+        if process is None or not process.is_alive():
+            return
+        logging.info("Cancelling the running simulation")
+        if sys.platform != "win32":
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                process.kill()
+        else:
+            process.kill()
+        process.join()
+
+    def _shutdown_process(self):
+        if self._process is not None and self._process.is_alive():
+            self._tasks.put(None)
+            self._process.join(timeout=5)
+        self._kill_process()
@@ -0,0 +1,789 @@
+"""
+Sizing Engine Module
+
+This module contains the Qt-free oemof investment model behind both EcoSizer tools.
+It builds the energy system, solves it and computes the capacities and KPIs that
+the GUIs display, so households can be sized from scripts and batch jobs without
+opening a window.
+
+The module contains the following components:
+- SizingParams: The input parameters of one sizing case (sliders of the GUIs),
+  defined in sizing_params.py so the GUIs can use it without loading the model.
+- SizingResult: Optimal capacities, energy balance and KPIs of one sizing case.
+- SizingEngine: Loads the input profiles once and sizes one or many cases.
+- PersistentModel: A model built once whose cost coefficients are updated between solves.
+- model_size: Number of timesteps, variables and constraints of a model.
+- share: A part of a total in %, e.g. for self-consumption and self-sufficiency.
+- check_engine_kwargs: Check the arguments of an engine before starting worker processes.
+- size / size_many: Convenience functions using a shared default engine.
+
+Cases can name PV and load profiles of a profile_library.ProfileLibrary passed
+to the engine, e.g. one PV profile per location of a portfolio.
+Results can be kept across runs by passing a result_cache.ResultCache to the engine,
+and the stages of every run are timed by the telemetry.Telemetry of the engine.
+The bus flows are mapped to the result sequences by node labels and validated by
+result_schema; a model that does not match raises ResultSchemaError.
+Profiles may have any resolution (e.g. 15 minutes) and span several years; the
+resolution is taken from the timestamps of the load profile file.
+
+Usage:
+1. Create a SizingParams instance for every household to be sized.
+2. Call size(params) for a single case or size_many(iterable_of_params) for a batch.
+
+"""
+
+
+import os
+import inspect
+import hashlib
+import logging
+from dataclasses import dataclass, replace
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+from oemof.tools import economics
+from oemof import solph
+from result_cache import profiles_fingerprint
+from profile_store import load_profile_column
+from profile_library import open_library, KIND_PV, KIND_LOAD
+from solvers import SolverBackend, SolverConfig
+from aggregation import cluster_days, link_storage_daily
+import presolve
+from telemetry import Telemetry
+from result_schema import SEQUENCE_COLUMNS, ResultSchemaError, flows_from_model, flows_from_results
+from sizing_params import SizingParams, pv_max_capacity, MODE_PV_BESS, MODE_BESS, MODES
+
+
+# Location of the input profiles shipped with the tool
+INPUT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Input_Files"))
+LOAD_PROFILE_FILE = "Scaled_LP_H0.csv"
+PV_PROFILE_FILE = "Scaled_PV_Feed_in.csv"
+
+# Stages of a sizing run, reported to the progress callback of SizingEngine.size
+STAGE_LOAD = "load"
+STAGE_BUILD = "build"
+STAGE_SOLVE = "solve"
+STAGE_POST_PROCESS = "post-process"
+STAGES = (STAGE_LOAD, STAGE_BUILD, STAGE_SOLVE, STAGE_POST_PROCESS)
+# Reading the profile files, reported to the telemetry only (the engine does it once)
+STAGE_PROFILE_LOAD = "profile-load"
+
+HOURS_PER_YEAR = 8760
+
+# Measured peak memory of building and solving a model (HiGHS, both modes); grows
+# linearly with the number of timesteps, the solve time slightly faster (see README)
+MEMORY_PER_TIMESTEP_MB = 0.03
+BASE_MEMORY_MB = 150
+MAX_TIMESTEPS = 5 * HOURS_PER_YEAR * 4  # five years of quarter-hours
+
+
+@dataclass
+class SizingResult:
+    """
+    Optimal capacities, energy balance and KPIs of one sizing case.
+
+    Energies are given in kWh/Yr (averaged over multi-year horizons), capacities
+    in kWp and kWh and the KPIs (self consumption, self sufficiency and feed-in
+    percentage) in %. The flows around the electricity bus are kept in
+    `sequences` as float32 power values (kW) per timestep and the state of
+    charge in `storage_content` (float32, kWh); for results of the typical-days
+    mode (`typical_days` > 0) both only cover the representative days.
+    `solver` and `solve_time` record the backend used and the wall time of the
+    solve in seconds. `full_results` holds the complete solph results of all
+    components if the engine was created with full_results=True.
+    """
+    params: SizingParams
+    pv_capacity: float
+    storage_capacity: float
+    total_demand: float
+    total_pv_production: float
+    grid_feed_in: float
+    grid_import: float
+    self_consumption: float
+    self_sufficiency: float
+    feed_in_percentage: float
+    sequences: pd.DataFrame = None
+    storage_content: np.ndarray = None
+    typical_days: int = 0
+    solver: str = None
+    solve_time: float = None
+    full_results: dict = None
+
+    def kpis(self):
+        """Return the scalar results as a flat dictionary."""
+        return {
+            'pv_capacity': self.pv_capacity,
+            'storage_capacity': self.storage_capacity,
+            'total_demand': self.total_demand,
+            'total_pv_production': self.total_pv_production,
+            'grid_feed_in': self.grid_feed_in,
+            'grid_import': self.grid_import,
+            'self_consumption': self.self_consumption,
+            'self_sufficiency': self.self_sufficiency,
+            'feed_in_percentage': self.feed_in_percentage,
+        }
+
+
+def _no_progress(stage):
+    pass
+
+
+def share(part, total):
+    """Return part/total in %, or 0 if there is nothing to share."""
+    return float(part / total * 100) if total else 0.0
+
+
+def _extract(om, params, components):
+    """
+    Read the bus flows, storage content and investments of a solved model.
+
+    Only the variables the results need are read, straight into NumPy arrays,
+    instead of converting all variables with solph.processing.results. The bus
+    flows are mapped and validated by result_schema.
+    """
+    sequences = flows_from_model(om).to_frame()
+    storage, block = components["storage"], om.GenericInvestmentStorageBlock
+    storage_content = np.fromiter((block.storage_content[storage, t].value for t in om.TIMESTEPS),
+                                  dtype=np.float64, count=len(om.TIMESTEPS)).astype(np.float32)
+    storage_capacity = sum(block.invest[storage, p].value for p in om.PERIODS)
+    if params.mode == MODE_PV_BESS:
+        pv_capacity = sum(om.InvestmentFlowBlock.invest[components["pv"], components["bus"], p].value
+                          for p in om.PERIODS)
+    else:
+        pv_capacity = params.pv_capacity
+    return sequences, storage_content, pv_capacity, storage_capacity
+
+
+def _extract_full(results, params, components, steps):
+    """Read the same values as _extract from the complete solph results."""
+    sequences = flows_from_results(results, steps).to_frame()
+
+    if params.mode == MODE_PV_BESS:
+        pv_capacity = results[(components["pv"], components["bus"])]["scalars"]["invest"]
+    else:
+        pv_capacity = params.pv_capacity
+    storage = results[(components["storage"], None)]
+    storage_capacity = storage["scalars"]["invest"]
+    storage_content = storage["sequences"]["storage_content"].to_numpy(dtype=np.float32)[:steps]
+    return sequences, storage_content, pv_capacity, storage_capacity
+
+
+def model_size(om):
+    """Return the number of timesteps, variables and constraints of a built model."""
+    return {'timesteps': len(om.TIMESTEPS), 'variables': om.nvariables(), 'constraints': om.nconstraints()}
+
+
+def estimate_memory_mb(timesteps):
+    """Return the estimated peak memory (MB) of building and solving a model with this many timesteps."""
+    return BASE_MEMORY_MB + MEMORY_PER_TIMESTEP_MB * timesteps
+
+
+def profile_resolution(csv_path):
+    """
+    Return the length of a timestep of a profile file in hours.
+
+    The resolution is the difference of the first two timestamps in the index
+    column; files without parsable timestamps are taken to be hourly.
+    """
+    try:
+        stamps = pd.to_datetime(pd.read_csv(csv_path, usecols=[0], nrows=2).iloc[:, 0])
+        hours = (stamps.iloc[1] - stamps.iloc[0]) / pd.Timedelta(hours=1)
+    except (ValueError, TypeError, IndexError):
+        return 1.0
+    return hours if hours > 0 else 1.0
+
+
+def horizon_years(timeindex, objective_weighting=None):
+    """
+    Return the number of years a model stands for.
+
+    This is the sum of the timestep lengths in hours, or of the objective
+    weighting if one is given (typical days), divided by 8760.
+    """
+    if objective_weighting is not None:
+        return float(np.sum(objective_weighting)) / HOURS_PER_YEAR
+    return (timeindex[-1] - timeindex[0]) / pd.Timedelta(hours=1) / HOURS_PER_YEAR
+
+
+def load_profiles(input_dir=INPUT_DIR):
+    """
+    Read the normalised load (BDEW H0) and PV feed-in (AC) profiles.
+
+    The columns come from the process-wide profile store, so the CSV files are
+    only parsed when they changed and are otherwise memory-mapped. The values
+    are average powers per timestep; for hourly profiles they equal the energy
+    of every hour.
+
+    Returns:
+    -------
+        tuple of pandas.Series
+            The load profile (kW per MWh of annual demand; an hourly profile
+            sums up to 1000 kWh per MWh) and the PV feed-in profile (kW per kWp).
+    """
+    load_demand = load_profile_column(os.path.join(input_dir, LOAD_PROFILE_FILE), 'h0')
+    PV_feed = load_profile_column(os.path.join(input_dir, PV_PROFILE_FILE), 'AC_Power')
+    return pd.Series(load_demand, name='h0', copy=False), pd.Series(PV_feed, name='AC_Power', copy=False)
+
+
+def structure_key(params):
+    """
+    Return the parameters that change the structure of the model.
+
+    Cases with the same structure key can share one PersistentModel; all other
+    parameters only change coefficients.
+    """
+    return (params.mode, params.loss_rate, params.c_rate,
+            params.inflow_conversion_factor, params.outflow_conversion_factor)
+
+
+class PersistentModel:
+    """
+    An oemof model that is built once and re-parameterised between solves.
+
+    The grid prices, the annuities of PV and storage, the demand scaling and the
+    PV size or limit are turned into mutable pyomo parameters. The objective is
+    rebuilt on these parameters and the fixed demand (and, in "bess" mode, PV)
+    flows become equality constraints scaled by them, so a new case only updates
+    parameter values instead of constructing all timesteps of the model again.
+
+    Parameters:
+    -----------
+        engine: SizingEngine
+            Engine providing the profiles and the model build.
+        params: SizingParams
+            Case used to build the model; defines the structure key.
+        duals: bool
+            Import dual values and reduced costs from the solver.
+    """
+
+    def __init__(self, engine, params, duals=False):
+        self.structure = structure_key(params)
+        self.mode = params.mode
+        with engine.telemetry.stage(STAGE_BUILD, persistent=True) as details:
+            self.om, self.components = engine.build_model(params)
+            details.update(model_size(self.om))
+        om, c = self.om, self.components
+        if duals:
+            del om.dual, om.rc  # plain None attributes, replaced by suffixes
+            om.receive_duals()
+        self.years = horizon_years(engine.timeindex)
+        bel = c["bus"]
+
+        om.ecosizer_price = po.Param(mutable=True, initialize=0)
+        om.ecosizer_feedin_price = po.Param(mutable=True, initialize=0)
+        om.ecosizer_epc_pv = po.Param(mutable=True, initialize=0)
+        om.ecosizer_epc_storage = po.Param(mutable=True, initialize=0)
+        om.ecosizer_demand = po.Param(mutable=True, initialize=0)
+        om.ecosizer_pv_capacity = po.Param(mutable=True, initialize=0)
+
+        load = list(engine.load_profile)
+        pv = list(engine.pv_profile)
+        timeindex = list(om.TIMEINDEX)
+
+        # Fixed flows become constraints on the mutable scaling parameters
+        fixed_flows = [(c["demand"], load, om.ecosizer_demand, (bel, c["demand"]))]
+        if self.mode == MODE_BESS:
+            fixed_flows.append((c["pv"], pv, om.ecosizer_pv_capacity, (c["pv"], bel)))
+        for node, profile, scale, (o, i) in fixed_flows:
+            for p, t in timeindex:
+                om.flow[o, i, p, t].unfix()
+            om.add_component(
+                f"ecosizer_fix_{node.label}",
+                po.Constraint(timeindex, rule=lambda m, p, t, o=o, i=i, profile=profile, scale=scale:
+                              m.flow[o, i, p, t] == profile[t] * scale))
+
+        if self.mode == MODE_PV_BESS:
+            self.pv_invest = [om.InvestmentFlowBlock.invest[c["pv"], bel, p] for p in om.PERIODS]
+        self.storage_invest = [om.GenericInvestmentStorageBlock.invest[c["storage"], p] for p in om.PERIODS]
+
+        # Objective on the mutable cost parameters
+        om.del_component(om.objective)
+        expr = sum(
+            (om.ecosizer_price * om.flow[c["grid_supply"], bel, p, t]
+             - om.ecosizer_feedin_price * om.flow[bel, c["grid_feed_in"], p, t]) * om.objective_weighting[t]
+            for p, t in timeindex)
+        expr += om.ecosizer_epc_storage * sum(self.storage_invest)
+        if self.mode == MODE_PV_BESS:
+            expr += om.ecosizer_epc_pv * sum(self.pv_invest)
+        om.objective = po.Objective(expr=expr, sense=po.minimize)
+
+    def update(self, params):
+        """Set the coefficients of a case with the same structure key."""
+        if structure_key(params) != self.structure:
+            raise ValueError("Parameters change the model structure, a new PersistentModel is needed")
+        om = self.om
+        om.ecosizer_price = params.electricity_price / 100
+        om.ecosizer_feedin_price = params.feedin_price / 100
+        om.ecosizer_epc_storage = self.years * economics.annuity(
+            capex=params.bess_capex, n=params.bess_lifetime, wacc=params.wacc)
+        om.ecosizer_demand = params.annual_demand / 1000
+        if self.mode == MODE_PV_BESS:
+            om.ecosizer_epc_pv = self.years * economics.annuity(
+                capex=params.pv_capex, n=params.pv_lifetime, wacc=params.wacc)
+            for var in self.pv_invest:
+                var.setub(params.pv_limit())
+        else:
+            om.ecosizer_pv_capacity = params.pv_capacity
+        return om
+
+
+class SizingEngine:
+    """
+    Headless sizing engine for the EcoSizer tools.
+
+    The engine reads the input profiles and sets up the solver once, so that
+    many households can be sized one after another without paying for it again.
+
+    Parameters:
+    -----------
+        input_dir: str
+            Directory holding the load and PV profiles.
+        solver: str or solvers.SolverConfig
+            Name of the solver ("glpk", "cbc", "highs", ...) or a SolverConfig
+            with fallbacks and solver options.
+        solve_kwargs: dict
+            Additional arguments for the solve call, e.g. {"tee": True}.
+        cache: result_cache.ResultCache
+            Optional persistent cache; cases already solved with the same
+            profiles are returned from it without solving.
+        persistent: bool
+            Build one PersistentModel per model structure and only update its
+            coefficients between solves, instead of building a model per case.
+        typical_days: int
+            If set, solve on this number of clustered typical days instead of
+            the full year (see aggregation.py). Needs hourly profiles.
+        timestep_hours: float
+            Length of a profile timestep in hours; by default it is read from
+            the timestamps of the load profile file.
+        max_timesteps: int
+            Profiles with more timesteps are rejected, because the model would
+            need too much memory (see estimate_memory_mb).
+        telemetry: telemetry.Telemetry
+            Receives a StageEvent with duration, memory delta and model size
+            for every stage of every run; events are discarded by default.
+        full_results: bool
+            Keep the complete solph results (solph.processing.results) of every
+            case in SizingResult.full_results. By default only the bus flows,
+            the storage content and the investments are read from the model.
+        library: str or profile_library.ProfileLibrary
+            Profile library (or the path of its array file) holding the profiles
+            named by SizingParams.pv_profile_key and load_profile_key; its
+            profiles need the length and resolution of the engine's profiles.
+        presolve: bool
+            Fix the flows that the sign of the net load determines before
+            solving (see presolve.py), for cases where presolve.applicable
+            holds. Only full-year models are presolved; persistent models and
+            typical days are solved as they are.
+    """
+
+    def __init__(self, input_dir=INPUT_DIR, solver="glpk", solve_kwargs=None, cache=None, persistent=False,
+                 typical_days=None, timestep_hours=None, max_timesteps=MAX_TIMESTEPS, telemetry=None,
+                 full_results=False, library=None, presolve=False):
+        self.input_dir = input_dir
+        self.profile_files = [os.path.join(input_dir, LOAD_PROFILE_FILE), os.path.join(input_dir, PV_PROFILE_FILE)]
+        self.solver_backend = SolverBackend(solver, solve_kwargs)
+        self.solver = self.solver_backend.config.name
+        self.cache = cache
+        self.persistent = persistent
+        self.typical_days = typical_days
+        self.fixed_timestep_hours = timestep_hours
+        self.max_timesteps = max_timesteps
+        self.telemetry = telemetry or Telemetry()
+        self.full_results = full_results
+        self.presolve = presolve
+        # Paths are mapped once per process, so worker processes share the pages of the library
+        self.library = open_library(library) if isinstance(library, str) else library
+        self._models = {}
+        self.reload_profiles()
+
+    def reload_profiles(self):
+        """Read the input profiles and remember the fingerprint of the files they were read from."""
+        with self.telemetry.stage(STAGE_PROFILE_LOAD) as details:
+            self.profiles_fingerprint = profiles_fingerprint(self.profile_files)
+            self.load_profile, self.pv_profile = load_profiles(self.input_dir)
+            details['timesteps'] = len(self.load_profile)
+        if len(self.load_profile) != len(self.pv_profile):
+            raise ValueError(f"The load profile has {len(self.load_profile)} timesteps, "
+                             f"the PV profile {len(self.pv_profile)}")
+        if len(self.load_profile) > self.max_timesteps:
+            raise ValueError(
+                f"The profiles have {len(self.load_profile)} timesteps, more than max_timesteps="
+                f"{self.max_timesteps}; the model would need about "
+                f"{estimate_memory_mb(len(self.load_profile)) / 1024:.1f} GB of memory")
+        self.timestep_hours = self.fixed_timestep_hours or profile_resolution(self.profile_files[0])
+        # infer_last_interval=False turns n timestamps into n-1 timesteps
+        self.timeindex = pd.date_range("1/1/2012", periods=len(self.load_profile) + 1,
+                                       freq=pd.Timedelta(hours=self.timestep_hours))
+        self.years = horizon_years(self.timeindex)
+        logging.debug(f"{len(self.load_profile)} timesteps of {self.timestep_hours} h, estimated "
+                      f"model memory {estimate_memory_mb(len(self.load_profile)):.0f} MB")
+        self._models = {}  # persistent models hold the old profiles
+        self.aggregation = None
+        if self.typical_days:
+            self.aggregation = cluster_days(self.load_profile, self.pv_profile, self.typical_days)
+
+    def library_profile(self, key, kind):
+        """Return a profile of the library as Series, checked against the length and resolution of the engine."""
+        if self.library is None:
+            raise ValueError(f"The case names the {kind} profile {key!r}, but the engine has no profile library")
+        values = self.library.profile(key, kind)
+        if len(values) != len(self.load_profile) or self.library.timestep_hours != self.timestep_hours:
+            raise ValueError(f"The profile library has {self.library.timesteps} timesteps of "
+                             f"{self.library.timestep_hours:g} h, the engine {len(self.load_profile)} of "
+                             f"{self.timestep_hours:g} h")
+        return pd.Series(values, name='AC_Power' if kind == KIND_PV else 'h0', copy=False)
+
+    def presolve_model(self, om, components, params, load_profile, pv_profile, details):
+        """Fix the determined flows of a built model if presolve is enabled and applicable to the case."""
+        if not self.presolve or not presolve.applicable(params):
+            return
+        stats = presolve.fix_determined_flows(om, components, params, load_profile, pv_profile)
+        details.update({f"presolve_{name}": value for name, value in stats.to_dict().items()})
+        logging.info(f"Presolve fixed {stats.fixed_variables} of {stats.variables} variables "
+                     f"({stats.fixed_share():.0f} %)")
+
+    # Model building
+    #===============#
+    def build_model(self, params, load_profile=None, pv_profile=None, timeindex=None, objective_weighting=None):
+        """
+        Create the oemof energy system and optimisation model for one case.
+
+        The profiles and time index of the engine are used unless others are
+        given; `objective_weighting` weighs the operating costs of every timestep.
+        The annuities are multiplied by the number of years the model stands
+        for, so multi-year horizons compare costs over the same period.
+
+        Returns:
+        -------
+            tuple
+                The solph.Model and a dictionary with the pv and storage components
+                and the electricity bus.
+        """
+        load_profile = self.load_profile if load_profile is None else load_profile
+        pv_profile = self.pv_profile if pv_profile is None else pv_profile
+        timeindex = self.timeindex if timeindex is None else timeindex
+
+        years = horizon_years(timeindex, objective_weighting)
+        epc_storage = years * economics.annuity(capex=params.bess_capex, n=params.bess_lifetime, wacc=params.wacc)
+        energysystem = solph.EnergySystem(timeindex=timeindex, infer_last_interval=False)
+
+        bel = solph.buses.Bus(label="electricity")
+
+        # create fixed source object representing pv system
+        if params.mode == MODE_PV_BESS:
+            epc_pv = years * economics.annuity(capex=params.pv_capex, n=params.pv_lifetime, wacc=params.wacc)
+            pv_flow = solph.Flow(
+                fix=pv_profile,
+                investment=solph.Investment(ep_costs=epc_pv, maximum=params.pv_limit())
+            )
+        else:
+            pv_flow = solph.Flow(fix=pv_profile, nominal_value=params.pv_capacity)
+        pv = solph.components.Source(label="pv", outputs={bel: pv_flow})
+
+        # create simple sink object representing the electrical demand
+        demand = solph.components.Sink(
+            label="demand",
+            inputs={bel: solph.Flow(
+                fix=load_profile,
+                nominal_value=params.annual_demand / 1000,
+            )}
+        )
+
+        grid_supply = solph.components.Source(
+            label="grid_supply",
+            outputs={bel: solph.Flow(variable_costs=params.electricity_price / 100)}
+        )
+
+        grid_feed_in = solph.components.Sink(
+            label="grid_feed_in",
+            inputs={bel: solph.Flow(variable_costs=-params.feedin_price / 100)}
+        )
+
+        # create storage object representing a battery
+        storage = solph.components.GenericStorage(
+            label="storage",
+            inputs={bel: solph.Flow()},
+            outputs={bel: solph.Flow()},
+            balanced=True,
+            loss_rate=params.loss_rate,
+            invest_relation_input_capacity=params.c_rate,
+            invest_relation_output_capacity=params.c_rate,
+            inflow_conversion_factor=params.inflow_conversion_factor,
+            outflow_conversion_factor=params.outflow_conversion_factor,
+            investment=solph.Investment(ep_costs=epc_storage),
+        )
+
+        energysystem.add(bel, pv, demand, grid_supply, grid_feed_in, storage)
+        if objective_weighting is None:
+            om = solph.Model(energysystem)
+        else:
+            om = solph.Model(energysystem, objective_weighting=objective_weighting)
+        return om, {"bus": bel, "pv": pv, "demand": demand, "grid_supply": grid_supply,
+                    "grid_feed_in": grid_feed_in, "storage": storage}
+
+    # Solving
+    #========#
+    def solve_model(self, om):
+        """
+        Solve a model with the engine's solver backend, reusing the solver instance.
+
+        Mirrors solph.Model.solve, but creates the pyomo solver only once per engine.
+        """
+        solves = len(self.solver_backend.timings)
+        with self.telemetry.stage(STAGE_SOLVE) as details:
+            try:
+                solver_results = self.solver_backend.solve(om)
+            finally:
+                if len(self.solver_backend.timings) != solves:  # also report solves without optimum
+                    stats = self.solver_backend.last_stats()
+                    stats.pop('seconds')  # the duration of the stage
+                    details.update(stats)
+        om.es.results = solver_results
+        om.solver_results = solver_results
+        return solver_results
+
+    # Post-processing
+    #================#
+    def process_results(self, params, om, components, weights=None, typical_days=0):
+        """
+        Extract capacities, the energy balance and the KPIs from a solved model.
+
+        `weights` gives the number of hours every timestep stands for; by
+        default the objective weighting of the model (the timestep length, or
+        the day weights of typical days) is used. Energies are annual averages.
+        """
+        with self.telemetry.stage(STAGE_POST_PROCESS, typical_days=typical_days, full_results=self.full_results):
+            steps = len(om.TIMESTEPS)
+            full_results = None
+            if self.full_results:
+                full_results = solph.processing.results(om)
+                sequences, storage_content, pv_capacity, storage_capacity = _extract_full(
+                    full_results, params, components, steps)
+            else:
+                sequences, storage_content, pv_capacity, storage_capacity = _extract(om, params, components)
+
+            if weights is None:
+                weights = [om.objective_weighting[t] for t in om.TIMESTEPS]
+            weights = np.asarray(weights, dtype=float)
+            years = weights.sum() / HOURS_PER_YEAR
+            totals = {name: float(sequences[name].to_numpy(dtype=float) @ weights) / years
+                      for name in SEQUENCE_COLUMNS}
+            total_pv_production = totals['Pv_feed_in']
+            grid_feed_in = totals['grid_feed_in']
+            grid_import = totals['grid_supply']
+            demand = totals['demand']
+
+            return SizingResult(
+                params=params,
+                pv_capacity=float(pv_capacity),
+                storage_capacity=float(storage_capacity),
+                total_demand=params.annual_demand,
+                total_pv_production=float(total_pv_production),
+                grid_feed_in=float(grid_feed_in),
+                grid_import=float(grid_import),
+                self_consumption=share(total_pv_production - grid_feed_in, total_pv_production),
+                self_sufficiency=share(demand - grid_import, demand),
+                feed_in_percentage=share(grid_feed_in, total_pv_production),
+                sequences=sequences,
+                storage_content=storage_content,
+                typical_days=typical_days,
+                solver=self.solver_backend.backend,
+                solve_time=self.solver_backend.last_solve_time(),
+                full_results=full_results,
+            )
+
+    def size_typical_days(self, params, k, progress=None, load_profile=None, pv_profile=None):
+        """
+        Size one case on k typical days instead of the full year.
+
+        The representative days are solved as one short time series, their
+        operating costs weighted by the number of days they represent, and the
+        storage state is linked day by day (see aggregation.link_storage_daily).
+        A household `load_profile` or `pv_profile` is clustered on every call;
+        the days of the engine's own profiles are kept for the next case.
+        """
+        progress = progress or _no_progress
+        if self.timestep_hours != 1:
+            raise ValueError("Typical days need hourly profiles")
+        if load_profile is not None or pv_profile is not None:
+            load_profile = self.load_profile if load_profile is None else load_profile
+            pv_profile = self.pv_profile if pv_profile is None else pv_profile
+            aggregation = cluster_days(load_profile, pv_profile, k)
+        else:
+            if self.aggregation is None or self.aggregation.k != k:
+                self.aggregation = cluster_days(self.load_profile, self.pv_profile, k)
+            aggregation = self.aggregation
+            load_profile, pv_profile = self.load_profile, self.pv_profile
+        hours = aggregation.hours()
+        weights = aggregation.hour_weights()
+        # infer_last_interval=False turns n timestamps into n-1 timesteps
+        timeindex = pd.date_range("1/1/2012", periods=len(hours) + 1, freq="h")
+
+        progress(STAGE_BUILD)
+        with self.telemetry.stage(STAGE_BUILD, typical_days=aggregation.k) as details:
+            load_profile = load_profile.iloc[hours].reset_index(drop=True)
+            pv_profile = pv_profile.iloc[hours].reset_index(drop=True)
+            om, components = self.build_model(params, load_profile=load_profile, pv_profile=pv_profile,
+                                              timeindex=timeindex, objective_weighting=list(weights))
+            link_storage_daily(om, components["storage"], aggregation.k)
+            details.update(model_size(om))
+        progress(STAGE_SOLVE)
+        self.solve_model(om)
+        progress(STAGE_POST_PROCESS)
+        return self.process_results(params, om, components, weights=weights, typical_days=aggregation.k)
+
+    # Public API
+    #===========#
+    def size(self, params, typical_days=None, progress=None, load_profile=None):
+        """
+        Size one household.
+
+        Parameters:
+        -----------
+            params: SizingParams
+                Input parameters of the case.
+            typical_days: int
+                Overrides the typical days of the engine for this case; 0 solves
+                the full year.
+            progress: callable
+                Called with the name of every stage (STAGES) when it starts.
+            load_profile: array_like
+                Load profile of this household in the units of the engine's
+                profile (kW per MWh of annual demand), instead of the BDEW H0
+                profile; needs the length and resolution of the PV profile.
+
+        Returns:
+        --------
+            SizingResult
+        """
+        progress = progress or _no_progress
+        typical_days = self.typical_days if typical_days is None else typical_days
+        cache_tag = f"{self.solver_backend.cache_tag()}|typical_days={typical_days or 0}"
+        if self.fixed_timestep_hours:
+            cache_tag += f"|timestep_hours={self.timestep_hours:g}"  # overrides the timestamps of the files
+        if self.presolve and not typical_days:
+            cache_tag += "|presolve"  # same optimum, but possibly another of several optimal dispatches
+        if load_profile is not None:
+            load_profile = pd.Series(np.asarray(load_profile, dtype=float), name='h0')
+            if len(load_profile) != len(self.pv_profile):
+                raise ValueError(f"The load profile has {len(load_profile)} timesteps, "
+                                 f"the PV profile {len(self.pv_profile)}")
+            cache_tag += f"|load={hashlib.sha256(load_profile.to_numpy().tobytes()).hexdigest()[:16]}"
+        pv_profile = None
+        if params.load_profile_key is not None:
+            if load_profile is not None:
+                raise ValueError("Pass either load_profile or SizingParams.load_profile_key, not both")
+            load_profile = self.library_profile(params.load_profile_key, KIND_LOAD)
+        if params.pv_profile_key is not None:
+            pv_profile = self.library_profile(params.pv_profile_key, KIND_PV)
+        if params.load_profile_key is not None or params.pv_profile_key is not None:
+            # The keys are part of the params, the library content is not
+            cache_tag += f"|library={self.library.fingerprint[:16]}"
+
+        self.telemetry.new_run()
+        progress(STAGE_LOAD)
+        with self.telemetry.stage(STAGE_LOAD) as details:
+            result = None
+            if self.cache is not None:
+                # Profiles edited on disk invalidate both the loaded profiles and the cache entries
+                if profiles_fingerprint(self.profile_files) != self.profiles_fingerprint:
+                    logging.info("Input profiles changed, reloading them")
+                    stale = self.profiles_fingerprint
+                    self.reload_profiles()
+                    self.cache.invalidate(stale)
+                result = self.cache.get(params, self.profiles_fingerprint, cache_tag)
+            details['cache_hit'] = result is not None
+        if result is not None:
+            logging.info("Sizing result taken from cache")
+            return result
+
+        if typical_days:
+            logging.info(f"Solve on {typical_days} typical days")
+            result = self.size_typical_days(params, typical_days, progress, load_profile, pv_profile)
+        else:
+            progress(STAGE_BUILD)
+            if self.persistent and load_profile is None and pv_profile is None:
+                model = self._models.get(structure_key(params))
+                if model is None:
+                    logging.info("Initialize the persistent energy system")
+                    model = self._models[structure_key(params)] = PersistentModel(self, params)
+                with self.telemetry.stage(STAGE_BUILD, persistent=True, update=True):
+                    om, components = model.update(params), model.components
+            else:
+                logging.info("Initialize the energy system")
+                with self.telemetry.stage(STAGE_BUILD) as details:
+                    om, components = self.build_model(params, load_profile=load_profile, pv_profile=pv_profile)
+                    details.update(model_size(om))
+                    self.presolve_model(om, components, params,
+                                        self.load_profile if load_profile is None else load_profile,
+                                        self.pv_profile if pv_profile is None else pv_profile, details)
+            logging.info("Solve the optimization problem")
+            progress(STAGE_SOLVE)
+            self.solve_model(om)
+            progress(STAGE_POST_PROCESS)
+            result = self.process_results(params, om, components)
+
+        if self.cache is not None:
+            self.cache.put(params, self.profiles_fingerprint, replace(result, full_results=None), cache_tag)
+        return result
+
+    def size_many(self, params_iterable):
+        """
+        Size a batch of households, yielding one SizingResult per case in input order.
+
+        The profiles and solver instance of the engine are shared by all cases.
+        """
+        for params in params_iterable:
+            yield self.size(params)
+
+
+def check_engine_kwargs(engine_kwargs):
+    """
+    Check that a SizingEngine can be set up with these arguments.
+
+    The profile files must exist, the solver (or one of its fallbacks) must be
+    installed and a profile library given by path must open. Process pools call
+    this before starting their workers, whose setup failures could otherwise
+    only be seen as workers dying and being respawned.
+
+    Raises:
+    -------
+        OSError, RuntimeError or ValueError
+            Describing the first problem found.
+    """
+    try:
+        arguments = inspect.signature(SizingEngine).bind(**engine_kwargs)
+    except TypeError as e:
+        raise ValueError(f"Invalid engine arguments: {e}") from None
+    arguments.apply_defaults()
+    arguments = arguments.arguments
+    for name in (LOAD_PROFILE_FILE, PV_PROFILE_FILE):
+        path = os.path.join(arguments['input_dir'], name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"The profile file {path} does not exist")
+    SolverBackend(arguments['solver'], arguments['solve_kwargs']).resolve()
+    if isinstance(arguments['library'], str):
+        open_library(arguments['library'])
+
+
+# Module level convenience API
+#=============================#
+_default_engine = None
+
+
+def get_engine():
+    """Return the shared default engine, creating it on first use."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = SizingEngine()
+    return _default_engine
+
+
+def size(params):
+    """Size one household with the shared default engine."""
+    return get_engine().size(params)
+
+
+def size_many(params_iterable):
+    """Size a batch of households with the shared default engine."""
+    return get_engine().size_many(params_iterable)
@@ -0,0 +1,80 @@
+"""
+Sizing Parameters Module
+
+This module contains the input parameters of a sizing case. It only depends on
+the standard library, so the GUIs can collect the slider values into a
+SizingParams at startup without importing oemof, pyomo or pandas; the sizing
+engine itself is loaded in the solver process.
+
+The module contains the following components:
+- MODE_PV_BESS / MODE_BESS: The sizing modes of the two EcoSizer tools.
+- pv_max_capacity: The PV capacity limit following the feed-in tariff.
+- SizingParams: The input parameters of one sizing case (sliders of the GUIs).
+
+Usage:
+1. Import SizingParams from here or from sizing_engine, which re-exports it.
+
+"""
+
+
+from dataclasses import dataclass, asdict
+
+
+# Sizing modes of the two EcoSizer tools
+MODE_PV_BESS = "pv-bess"   # EcoSizer SunVault: optimise PV and storage
+MODE_BESS = "bess"         # EcoSizer Storage: optimise storage for an existing PV system
+MODES = (MODE_PV_BESS, MODE_BESS)
+
+
+def pv_max_capacity(feedin_price):
+    """
+    Return the PV capacity limit (kWp) for a given feed-in tariff.
+
+    Following the EEG amendments considering partial feed-in, the PV system is
+    limited to 10 kWp if the FiT is 8 €-cents/kWh or above, otherwise to 30 kWp.
+    """
+    return 10 if feedin_price >= 8 else 30
+
+
+@dataclass(frozen=True)
+class SizingParams:
+    """
+    Input parameters of one sizing case.
+
+    Prices are given in €-cents/kWh, CAPEX values in €/kWp and €/kWh, the annual
+    demand in kWh/Yr and the existing PV capacity (only used in "bess" mode) in kWp.
+    If pv_max_capacity is None, the limit follows the feed-in tariff rule of
+    `pv_max_capacity`. pv_profile_key and load_profile_key select profiles of
+    the engine's profile library (see profile_library.py) instead of the
+    shipped PV and BDEW H0 profiles.
+    """
+    mode: str = MODE_PV_BESS
+    pv_capex: float = 1200
+    bess_capex: float = 700
+    electricity_price: float = 35
+    feedin_price: float = 8
+    annual_demand: float = 4000
+    pv_capacity: float = 0
+    pv_max_capacity: float = None
+    pv_lifetime: int = 25
+    bess_lifetime: int = 10
+    wacc: float = 0.03
+    loss_rate: float = 0.005
+    c_rate: float = 1/6
+    inflow_conversion_factor: float = 1
+    outflow_conversion_factor: float = 1
+    pv_profile_key: str = None
+    load_profile_key: str = None
+
+    def __post_init__(self):
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown sizing mode {self.mode!r}, expected one of {MODES}")
+
+    def pv_limit(self):
+        """Return the PV capacity limit (kWp) used for the PV investment."""
+        if self.pv_max_capacity is not None:
+            return self.pv_max_capacity
+        return pv_max_capacity(self.feedin_price)
+
+    def to_dict(self):
+        return asdict(self)
@@ -0,0 +1,284 @@
+"""
+Solvers Module
+
+This module wraps the LP solvers the sizing engine can use behind one interface.
+A SolverConfig names the preferred backend (GLPK, CBC, HiGHS or any other solver
+pyomo knows), the fallbacks to try if it is not installed, and the generic solver
+options (threads, time limit, MIP gap, simplex or interior point method), which
+are translated into the option names of the backend that is actually used.
+
+The module contains the following components:
+- SolverConfig: Preferred backend, fallbacks and generic solver options.
+- SolverBackend: Resolves the first installed backend, solves models and records
+  the time and LP size of every solve.
+- available_solvers: The known backends that are installed on this machine.
+
+Usage:
+1. Create a SolverConfig, e.g. SolverConfig("highs", threads=4, time_limit=60).
+2. Pass it to the engine: SizingEngine(solver=config). A plain name such as
+   "glpk" works as before.
+
+"""
+
+
+import json
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from pyomo.opt import SolverFactory
+
+
+# Names used in SolverConfig mapped to the pyomo solver names
+SOLVER_ALIASES = {
+    'highs': 'appsi_highs',  # HiGHS through the highspy bindings
+    'glpk': 'glpk',
+    'cbc': 'cbc',
+}
+DEFAULT_FALLBACKS = ('highs', 'cbc', 'glpk')
+METHODS = ('simplex', 'ipm')
+
+# Generic options translated into the options of every backend
+_OPTION_NAMES = {
+    'glpk': {'mip_gap': 'mipgap'},
+    'cbc': {'threads': 'threads', 'mip_gap': 'ratio'},
+    'highs': {'threads': 'threads', 'mip_gap': 'mip_rel_gap'},
+}
+_METHOD_OPTIONS = {
+    'glpk': {'simplex': {'simplex': ''}, 'ipm': {'interior': ''}},
+    'cbc': {'ipm': {'barrier': ''}},
+    'highs': {'simplex': {'solver': 'simplex'}, 'ipm': {'solver': 'ipm'}},
+}
+
+
+@dataclass(frozen=True)
+class SolverConfig:
+    """
+    Solver backend and options of the sizing engine.
+
+    Parameters:
+    -----------
+        name: str
+            Preferred backend: "glpk", "cbc", "highs" or any pyomo solver name.
+        fallbacks: tuple
+            Backends tried in order if the preferred one is not installed.
+        threads: int
+            Number of solver threads (ignored by GLPK, which is single-threaded).
+        time_limit: float
+            Time limit per solve in seconds.
+        mip_gap: float
+            Relative MIP gap; only relevant for models with integer variables.
+        method: str
+            "simplex" or "ipm" (interior point); None keeps the solver default.
+        options: dict
+            Further options passed to the backend unchanged.
+    """
+    name: str = 'glpk'
+    fallbacks: tuple = DEFAULT_FALLBACKS
+    threads: int = None
+    time_limit: float = None
+    mip_gap: float = None
+    method: str = None
+    options: dict = field(default_factory=dict, hash=False)
+
+    def __post_init__(self):
+        if self.method is not None and self.method not in METHODS:
+            raise ValueError(f"Unknown solver method {self.method!r}, expected one of {METHODS}")
+
+    @classmethod
+    def coerce(cls, solver):
+        """Return `solver` as SolverConfig; a plain name selects that solver with default options."""
+        return solver if isinstance(solver, cls) else cls(name=solver)
+
+    def solver_options(self, backend):
+        """Return the options of this configuration in the option names of `backend`."""
+        options = {}
+        names = _OPTION_NAMES.get(backend, {})
+        for generic in ('threads', 'mip_gap'):
+            value = getattr(self, generic)
+            if value is None:
+                continue
+            if generic in names:
+                options[names[generic]] = value
+            else:
+                logging.debug(f"Solver option {generic} is not supported by {backend}, ignored")
+        if self.method is not None:
+            method_options = _METHOD_OPTIONS.get(backend, {}).get(self.method)
+            if method_options is None:
+                logging.debug(f"Solver method {self.method} is not supported by {backend}, ignored")
+            else:
+                options.update(method_options)
+        options.update(self.options)
+        return options
+
+
+def _number(value):
+    """Return a figure of pyomo solver results as float, or None if it is not reported."""
+    try:
+        return float(getattr(value, 'value', value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _pyomo_name(backend):
+    return SOLVER_ALIASES.get(backend, backend)
+
+
+def _create(backend):
+    """Create the pyomo solver object of a backend."""
+    name = _pyomo_name(backend)
+    if name.startswith('appsi_'):
+        return SolverFactory(name)
+    return SolverFactory(name, solver_io="lp")
+
+
+def is_available(backend):
+    """Return True if the backend is installed and usable."""
+    try:
+        return bool(_create(backend).available(exception_flag=False))
+    except Exception:
+        return False
+
+
+def available_solvers(candidates=None):
+    """Return the backends out of `candidates` (default: all known) that are installed."""
+    return [backend for backend in (candidates or SOLVER_ALIASES) if is_available(backend)]
+
+
+class SolverBackend:
+    """
+    Solves models with the first installed backend of a SolverConfig.
+
+    The backend is resolved on the first solve and kept afterwards. The wall
+    times of the last solves are kept in `timings` and summed up per backend in
+    `totals`, so backends can be compared on real cases.
+
+    Parameters:
+    -----------
+        config: SolverConfig or str
+            Solver configuration or plain solver name.
+        solve_kwargs: dict
+            Additional arguments for the solve call, e.g. {"tee": True}.
+    """
+
+    def __init__(self, config, solve_kwargs=None):
+        self.config = SolverConfig.coerce(config)
+        self.solve_kwargs = {"tee": False} if solve_kwargs is None else dict(solve_kwargs)
+        self.backend = None
+        self.timings = deque(maxlen=1000)
+        self.totals = {}
+        self._opt = None
+        self._run_time = (None, 0.0)  # HiGHS instance and its run time after the last solve
+
+    def cache_tag(self):
+        """
+        Return the solver and every option that can change its solution, for the keys of cached results.
+
+        A time limit or other tolerances may stop at another solution, so
+        results solved with different options are cached apart.
+        """
+        config = self.config
+        settings = {'threads': config.threads, 'time_limit': config.time_limit, 'mip_gap': config.mip_gap,
+                    'method': config.method, 'options': config.options,
+                    'solve_kwargs': {name: value for name, value in self.solve_kwargs.items() if name != 'tee'}}
+        settings = {name: value for name, value in settings.items() if value not in (None, {})}
+        if not settings:
+            return config.name
+        return f"{config.name}|{json.dumps(settings, sort_keys=True, default=str)}"
+
+    def resolve(self):
+        """Return the name of the backend in use, choosing the first installed one on first call."""
+        if self.backend is None:
+            candidates = [self.config.name] + [b for b in self.config.fallbacks if b != self.config.name]
+            for backend in candidates:
+                if is_available(backend):
+                    if backend != self.config.name:
+                        logging.warning(f"Solver {self.config.name} is not available, using {backend} instead")
+                    self.backend = backend
+                    self._opt = _create(backend)
+                    break
+            else:
+                raise RuntimeError(f"None of the solvers {candidates} is installed")
+        return self.backend
+
+    def solve(self, om):
+        """
+        Solve a model and return the pyomo solver results.
+
+        Raises a RuntimeError if the solver does not report an optimal solution.
+        """
+        backend = self.resolve()
+        kwargs = dict(self.solve_kwargs)
+        options = self.config.solver_options(backend)
+        if options:
+            kwargs['options'] = options
+        if self.config.time_limit is not None:
+            kwargs['timelimit'] = self.config.time_limit
+
+        # solph sets om.dual/om.rc to None without duals, which the appsi interfaces take for suffixes
+        hidden = {name: om.__dict__.pop(name) for name in ('dual', 'rc')
+                  if name in om.__dict__ and om.__dict__[name] is None}
+        start = time.perf_counter()
+        try:
+            solver_results = self._opt.solve(om, **kwargs)
+        finally:
+            om.__dict__.update(hidden)
+        elapsed = time.perf_counter() - start
+
+        status = solver_results["Solver"][0]["Status"]
+        termination_condition = solver_results["Solver"][0]["Termination condition"]
+        self.timings.append({'solver': backend, 'seconds': elapsed, 'termination': str(termination_condition),
+                             **self._stats(solver_results, elapsed)})
+        count, seconds = self.totals.get(backend, (0, 0.0))
+        self.totals[backend] = (count + 1, seconds + elapsed)
+        if status != "ok" or termination_condition != "optimal":
+            raise RuntimeError(
+                f"Optimization ended with status {status} and termination condition {termination_condition}")
+        return solver_results
+
+    def _stats(self, solver_results, elapsed):
+        """
+        Return the LP size and the time spent inside the solver of the last solve.
+
+        HiGHS is asked directly; the file-based interfaces report the size in
+        the problem section of their results. The rest of the wall time,
+        `interface_seconds`, went into writing or transferring the model and
+        reading the solution back. Figures a backend does not report are None.
+        """
+        highs = getattr(self._opt, '_solver_model', None)
+        if highs is not None and hasattr(highs, 'getNumNz'):  # appsi HiGHS
+            # The run time adds up over the solves of an instance, a new model gets a new instance
+            instance, previous = self._run_time
+            run_time = highs.getRunTime()
+            solver_seconds = run_time - previous if instance is highs else run_time
+            self._run_time = (highs, run_time)
+            stats = {'rows': highs.getNumRow(), 'columns': highs.getNumCol(), 'nonzeros': highs.getNumNz(),
+                     'iterations': highs.getInfo().simplex_iteration_count, 'solver_seconds': solver_seconds}
+        else:
+            problem, solver = solver_results["Problem"][0], solver_results["Solver"][0]
+            stats = {'rows': _number(problem.get('Number of constraints')),
+                     'columns': _number(problem.get('Number of variables')),
+                     'nonzeros': _number(problem.get('Number of nonzeros')),
+                     'iterations': None,
+                     'solver_seconds': _number(solver.get('Time')) or _number(solver.get('Wallclock time'))}
+        solver_seconds = stats['solver_seconds']
+        stats['interface_seconds'] = elapsed - solver_seconds if solver_seconds is not None else None
+        return stats
+
+    def last_stats(self):
+        """Return backend, wall time, LP size and solver time of the last solve, or an empty dict."""
+        return dict(self.timings[-1]) if self.timings else {}
+
+    def warm_starts(self):
+        """
+        Return True if re-solving a modified model starts from the previous solution.
+
+        The appsi interfaces (HiGHS) keep the model in the solver and only pass
+        changed coefficients, so the solver restarts from its last basis. The
+        file-based interfaces (GLPK, CBC) solve every model from scratch.
+        """
+        return _pyomo_name(self.resolve()).startswith('appsi_')
+
+    def last_solve_time(self):
+        """Return the wall time of the last solve in seconds, or None."""
+        return self.timings[-1]['seconds'] if self.timings else None
@@ -0,0 +1,88 @@
+"""
+Startup Module
+
+This module keeps the startup of the EcoSizer GUIs fast. The windows only import
+Qt and the light modules before they are shown; plotly is imported on a
+background thread once the window is painted, and oemof, pyomo and pandas are
+only imported in the solver process of the SimulationWorker, which is started
+right away so that the first Run Simulation does not wait for them either.
+
+The time from the import of this module, the first import of the GUIs, to the
+first painted window is measured and logged, with a warning if it is above
+STARTUP_TARGET_SECONDS.
+
+The module contains the following components:
+- STARTUP_TARGET_SECONDS: Time to the first painted window we want to stay under.
+- preload: Import modules on a background thread.
+- report_startup: Log the startup time once the event loop has painted the window.
+
+Usage:
+1. Call report_startup(app) after showing the main window, before app.exec_().
+2. Start a GUI with --measure-startup to print the startup time and quit.
+
+"""
+
+
+import sys
+import time
+import logging
+import importlib
+import threading
+from PyQt5 import QtCore
+
+
+STARTUP_TARGET_SECONDS = 1.5
+MEASURE_FLAG = "--measure-startup"
+
+# Modules of the GUI thread that are imported after the window is shown
+LAZY_MODULES = ("plotly.graph_objects", "plotly.subplots")
+
+
+# Imported first by the GUIs, so this is the start of the startup measurement
+_START = time.perf_counter()
+
+
+def preload(modules=LAZY_MODULES):
+    """
+    Import modules on a daemon thread, so later imports on the GUI thread are cheap.
+
+    Returns:
+    --------
+        threading.Thread
+    """
+    def run():
+        start = time.perf_counter()
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                logging.warning(f"Could not preload {name}: {e}")
+        logging.debug(f"Preloaded {', '.join(modules)} in {time.perf_counter() - start:.2f} s")
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def report_startup(app, target=STARTUP_TARGET_SECONDS):
+    """
+    Log the startup time once the window is painted and start the preloading.
+
+    The timer fires when the event loop is idle for the first time, i.e. after
+    the shown window was painted. With --measure-startup on the command line the
+    time is printed and the application quits.
+    """
+    def report():
+        elapsed = time.perf_counter() - _START
+        message = f"Window painted {elapsed:.2f} s after startup (target {target:.2f} s)"
+        if elapsed > target:
+            logging.warning(message)
+        else:
+            logging.info(message)
+        if MEASURE_FLAG in sys.argv:
+            print(f"startup_seconds={elapsed:.3f}")
+            app.quit()
+        else:
+            preload()
+
+    QtCore.QTimer.singleShot(0, report)
@@ -0,0 +1,188 @@
+"""
+Storage Sizer Module
+
+This module contains an LP-free fast path for the storage-only sizing of the
+EcoSizer Storage tool. With the PV size fixed, only the storage capacity is
+optimised, so the yearly cost can be evaluated directly: a greedy battery dispatch
+(charge PV surplus, discharge on deficit) is simulated over the year in NumPy for
+many candidate capacities at once, and the cheapest capacity is found with a
+one-dimensional search on the annualised cost. Sizing a case on an hourly year
+takes about 0.3 s, mostly the dispatch recursion over the timesteps, against
+several seconds for the LP.
+
+The module contains the following components:
+- simulate_dispatch: Greedy dispatch of candidate storage capacities over the year.
+- FastStorageResult: Optimal capacity, energy balance and annual cost of a case.
+- size_storage: Fast sizing of a "bess" mode case, optionally checked against the LP.
+
+Usage:
+1. Create a SizingEngine (the profiles are taken from it).
+2. Call size_storage(engine, params) for a SizingParams with mode="bess".
+
+"""
+
+
+import logging
+from dataclasses import dataclass
+import numpy as np
+from oemof.tools import economics
+from sizing_engine import MODE_BESS, share
+
+
+@dataclass
+class FastStorageResult:
+    """
+    Result of the fast storage sizing.
+
+    Energies are given in kWh/Yr, the capacity in kWh and the annual cost
+    (energy bill minus FiT income plus storage annuity) in €/Yr. If the case was
+    cross-checked, `lp_storage_capacity` holds the capacity found by the solver,
+    `lp_deviation` the absolute difference to it and `verified` whether that is
+    within the tolerance of the check.
+    """
+    storage_capacity: float
+    grid_import: float
+    grid_feed_in: float
+    annual_cost: float
+    self_consumption: float
+    self_sufficiency: float
+    lp_storage_capacity: float = None
+    lp_deviation: float = None
+    verified: bool = None
+
+
+def simulate_dispatch(surplus, deficit, capacities, loss_rate, c_rate, eta_in=1.0, eta_out=1.0, passes=2,
+                      timestep_hours=1.0):
+    """
+    Simulate the greedy dispatch of several storage capacities over the year.
+
+    In every timestep the battery charges from the PV surplus and discharges to
+    cover the deficit, limited by its power (capacity times C-rate) and its content.
+    The year is simulated `passes` times, each pass starting with the content the
+    previous one ended with, which approximates the balanced (cyclic) storage of
+    the optimisation model.
+
+    The power limits do not depend on the content, so the change of content a
+    timestep asks for is computed for all timesteps and candidates at once; only
+    the clipping of the content to [0, capacity] is a recursion over time, one
+    NumPy call per timestep for all candidates. The charged and discharged
+    energy follow from the content series. An hourly year takes about 0.07 s per
+    call for 17 candidates; without a compiled recursion (e.g. numba, which is
+    not a dependency) it does not get down to milliseconds.
+
+    Parameters:
+    -----------
+        surplus, deficit: numpy.ndarray
+            PV surplus and residual demand of every timestep in kWh, both non-negative.
+        capacities: numpy.ndarray
+            Candidate storage capacities in kWh.
+        timestep_hours: float
+            Length of a timestep; scales the power limit and the hourly loss rate.
+
+    Returns:
+    --------
+        tuple of numpy.ndarray
+            Charged and discharged energy (kWh) of every candidate over the profiles.
+    """
+    capacities = np.asarray(capacities, dtype=float)
+    power = capacities * c_rate * timestep_hours  # energy per timestep
+    retain = (1 - loss_rate) ** timestep_hours
+    surplus, deficit = np.asarray(surplus, dtype=float)[:, None], np.asarray(deficit, dtype=float)[:, None]
+    # Requested change of content per timestep and candidate; charging has priority as in the LP-free rule
+    requested = np.where(surplus > 0, np.minimum(power, surplus) * eta_in,
+                         np.where(deficit > 0, -np.minimum(power, deficit) / eta_out, 0.0))
+    content = np.empty_like(requested)
+    level = np.zeros_like(capacities)
+    for _ in range(passes):
+        start = level.copy()
+        for t, change in enumerate(requested):
+            level *= retain
+            level += change
+            np.clip(level, 0.0, capacities, out=level)
+            content[t] = level
+    previous = np.vstack([start[None, :], content[:-1]]) * retain
+    delta = content - previous
+    charged = np.clip(delta, 0.0, None).sum(axis=0) / eta_in
+    discharged = np.clip(-delta, 0.0, None).sum(axis=0) * eta_out
+    return charged, discharged
+
+
+def size_storage(engine, params, max_capacity=None, tolerance=0.01, verify=False, verify_tolerance=0.1):
+    """
+    Size the storage of a "bess" mode case without solving an LP.
+
+    The annual cost of a coarse grid of capacities is evaluated first, then the
+    grid is refined around the cheapest capacity until its spacing is below
+    `tolerance` (kWh).
+
+    Parameters:
+    -----------
+        engine: SizingEngine
+            Engine providing the load and PV profiles.
+        params: SizingParams
+            Case with mode "bess".
+        max_capacity: float
+            Largest capacity searched, defaults to one day of the annual demand.
+        verify: bool
+            Also solve the case with the engine's LP and set `verified` to False
+            (and log a warning) if the capacities differ by more than
+            `verify_tolerance` (kWh or relative, whichever is larger).
+
+    Returns:
+    --------
+        FastStorageResult
+    """
+    if params.mode != MODE_BESS:
+        raise ValueError("The fast storage sizer only handles the 'bess' mode with a fixed PV size")
+
+    # Same timesteps as the LP: n timestamps without the last interval give n-1 steps
+    steps = len(engine.timeindex) - 1
+    tau = engine.timestep_hours
+    load = engine.load_profile.to_numpy()[:steps] * params.annual_demand / 1000 * tau  # kWh per timestep
+    pv = engine.pv_profile.to_numpy()[:steps] * params.pv_capacity * tau
+    net = pv - load
+    surplus = np.clip(net, 0, None)
+    deficit = np.clip(-net, 0, None)
+
+    price = params.electricity_price / 100
+    feedin_price = params.feedin_price / 100
+    epc = economics.annuity(capex=params.bess_capex, n=params.bess_lifetime, wacc=params.wacc)
+
+    def evaluate(capacities):
+        charged, discharged = simulate_dispatch(
+            surplus, deficit, capacities, params.loss_rate, params.c_rate,
+            params.inflow_conversion_factor, params.outflow_conversion_factor, timestep_hours=tau)
+        grid_import = (deficit.sum() - discharged) / engine.years
+        grid_feed_in = (surplus.sum() - charged) / engine.years
+        return price * grid_import - feedin_price * grid_feed_in + epc * capacities, grid_import, grid_feed_in
+
+    low, high = 0.0, max_capacity or params.annual_demand / 365
+    while True:
+        capacities = np.linspace(low, high, 17)
+        cost, grid_import, grid_feed_in = evaluate(capacities)
+        best = int(cost.argmin())
+        spacing = capacities[1] - capacities[0]
+        if spacing <= tolerance:
+            break
+        low, high = capacities[max(best - 1, 0)], capacities[min(best + 1, len(capacities) - 1)]
+
+    total_pv = pv.sum() / engine.years
+    demand = load.sum() / engine.years
+    result = FastStorageResult(
+        storage_capacity=float(capacities[best]),
+        grid_import=float(grid_import[best]),
+        grid_feed_in=float(grid_feed_in[best]),
+        annual_cost=float(cost[best]),
+        self_consumption=share(total_pv - grid_feed_in[best], total_pv),
+        self_sufficiency=share(demand - grid_import[best], demand),
+    )
+
+    if verify:
+        lp_capacity = engine.size(params).storage_capacity
+        result.lp_storage_capacity = lp_capacity
+        result.lp_deviation = deviation = abs(result.storage_capacity - lp_capacity)
+        result.verified = deviation <= max(verify_tolerance, verify_tolerance * lp_capacity)
+        if not result.verified:
+            logging.warning(f"Fast storage sizing ({result.storage_capacity:.2f} kWh) deviates from "
+                            f"the LP solution ({lp_capacity:.2f} kWh)")
+    return result
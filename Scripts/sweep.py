@@ -0,0 +1,203 @@
+"""
+Sweep Module
+
+This module runs parameter sweeps of the EcoSizer sizing model over grids of
+CAPEX, price, feed-in tariff and demand values. The sizing cases are fanned out
+over a process pool, every worker process holding its own SizingEngine, and the
+results are appended to a CSV file or a Parquet dataset as they arrive (see
+results_writer.py).
+
+The module contains the following components:
+- DEFAULT_GRID: The grid spanned by the sliders of the PV+BESS tool.
+- make_cases: Expand a grid into an ordered list of SizingParams.
+- run_sweep: Solve all cases in parallel with progress reporting and resume support.
+
+Usage:
+1. Define a grid as a dictionary of SizingParams field names to lists of values.
+2. Call run_sweep(grid, "results.csv"), or run_sweep(grid, "results_dir",
+   sequences=True) for a Parquet dataset including the bus flows. If the run is
+   interrupted, calling it again with the same arguments only solves the cases
+   missing in the results.
+
+"""
+
+
+import os
+import time
+import logging
+import itertools
+import multiprocessing
+import numpy as np
+from sizing_engine import SizingEngine, SizingParams, MODE_PV_BESS, check_engine_kwargs
+from results_writer import open_results_writer, completed_indices
+
+
+# Grid spanned by the sliders of PV_BESS_GUI.init_ui, at the slider tick spacing
+DEFAULT_GRID = {
+    'pv_capex': list(range(500, 2501, 200)),          # €/kWp
+    'bess_capex': list(range(300, 1501, 200)),        # €/kWh
+    'electricity_price': list(range(0, 101, 10)),     # €-cents/kWh
+    'feedin_price': list(range(0, 21, 2)),            # €-cents/kWh
+    'annual_demand': list(range(1000, 20001, 1000)),  # kWh/Yr
+}
+
+# Columns of the results file besides the swept parameters
+RESULT_COLUMNS = ['pv_capacity', 'storage_capacity', 'total_demand', 'total_pv_production',
+                  'grid_feed_in', 'grid_import', 'self_consumption', 'self_sufficiency',
+                  'feed_in_percentage']
+STATUS_COLUMNS = ['status', 'error']
+
+
+def make_cases(grid, mode=MODE_PV_BESS, **fixed):
+    """
+    Expand a parameter grid into a list of SizingParams.
+
+    The cases are ordered like itertools.product over the grid axes in the order
+    of the dictionary, so the position of a case in the list is stable and is
+    used as its index in the results file.
+
+    Parameters:
+    -----------
+        grid: dict
+            SizingParams field names mapped to the values to sweep.
+        mode: str
+            Sizing mode of all cases.
+        **fixed:
+            Further SizingParams fields shared by all cases.
+    """
+    names = list(grid)
+    return [SizingParams(mode=mode, **fixed, **dict(zip(names, values)))
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+# Worker process
+#===============#
+_worker_engine = None
+_worker_sequences = False
+_worker_error = None
+
+
+def _init_worker(engine_kwargs, sequences=False):
+    """Create the sizing engine of a worker process; profiles are read once per worker."""
+    global _worker_engine, _worker_sequences, _worker_error
+    _worker_sequences = sequences
+    try:
+        _worker_engine = SizingEngine(**engine_kwargs)
+    except Exception as e:  # a failing initializer makes the pool respawn workers forever
+        _worker_error = f"Engine setup failed: {type(e).__name__}: {e}"
+
+
+def _solve_case(task):
+    """Size one case in a worker process and return its results row and, if requested, its sequences."""
+    index, params = task
+    if _worker_error:
+        return index, None, None, _worker_error
+    try:
+        result = _worker_engine.size(params)
+    except Exception as e:  # keep the sweep going, the failure is recorded in the row
+        return index, None, None, f"{type(e).__name__}: {e}"
+    kpis = result.kpis()
+    sequences = result.sequences.to_numpy(dtype=np.float32) if _worker_sequences else None
+    return index, [kpis[name] for name in RESULT_COLUMNS], sequences, ""
+
+
+def _default_progress(done, total, elapsed):
+    rate = done / elapsed if elapsed else 0.0
+    eta = (total - done) / rate if rate else float('nan')
+    logging.info(f"Sweep progress: {done}/{total} cases ({rate:.1f} cases/s, ETA {eta:.0f} s)")
+
+
+# Public API
+#===========#
+def run_sweep(grid, results_file, mode=MODE_PV_BESS, jobs=None, chunksize=None,
+              progress=None, progress_every=100, engine_kwargs=None, sequences=False, **fixed):
+    """
+    Solve every case of a parameter grid over a process pool.
+
+    Results are appended to `results_file` in case order as soon as they are
+    available. Cases already present in the results are skipped, so an
+    interrupted sweep resumes where it stopped. Failed solves are written with
+    status "failed" and the error message instead of aborting the sweep.
+
+    Parameters:
+    -----------
+        grid: dict
+            SizingParams field names mapped to the values to sweep.
+        results_file: str
+            CSV file the results are appended to, or, for any path not ending
+            in ".csv", directory of a Parquet dataset (needs pyarrow).
+        mode: str
+            Sizing mode of all cases.
+        jobs: int
+            Number of worker processes, defaults to the number of CPUs.
+        chunksize: int
+            Number of cases handed to a worker at once. Defaults to a value that
+            gives every worker about four chunks.
+        progress: callable
+            Called as progress(done, total, elapsed_seconds) every
+            `progress_every` cases and at the end; logs the progress by default.
+        engine_kwargs: dict
+            Arguments for the SizingEngine of every worker, e.g. {"solver": "cbc"}.
+        sequences: bool
+            Also store the bus flows of every case (Parquet datasets only).
+        **fixed:
+            Further SizingParams fields shared by all cases.
+
+    Returns:
+    --------
+        dict
+            Number of cases in the grid, completed in this run (including the
+            failed ones), skipped because already present, and failed.
+
+    Raises:
+    -------
+        ValueError
+            If sequences are requested with a CSV results file.
+        OSError, RuntimeError or ValueError
+            If the engine can not be set up with `engine_kwargs`, see
+            sizing_engine.check_engine_kwargs.
+    """
+    if sequences and results_file.endswith('.csv'):
+        # Checked before the workers extract sequences that could not be stored
+        raise ValueError(f"Sequences are only stored in Parquet results, not in the CSV file {results_file}")
+    cases = make_cases(grid, mode=mode, **fixed)
+    done_indices = completed_indices(results_file)
+    tasks = [(index, params) for index, params in enumerate(cases) if index not in done_indices]
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = chunksize or max(1, len(tasks) // (jobs * 4))
+    progress = progress or _default_progress
+    names = list(grid)
+    summary = {'total': len(cases), 'completed': 0, 'skipped': len(cases) - len(tasks), 'failed': 0}
+
+    logging.info(f"Sweep of {len(cases)} cases, {len(tasks)} to solve on {jobs} processes")
+    if not tasks:
+        return summary
+    check_engine_kwargs(engine_kwargs or {})
+
+    start = time.perf_counter()
+    columns = ['index'] + names + RESULT_COLUMNS + STATUS_COLUMNS
+    with open_results_writer(results_file, columns, sequences=sequences) as writer:
+        with multiprocessing.Pool(jobs, initializer=_init_worker,
+                                  initargs=(engine_kwargs or {}, sequences)) as pool:
+            # imap keeps the case order, so the results stay sorted by index
+            for index, values, case_sequences, error in pool.imap(_solve_case, tasks, chunksize=chunksize):
+                params = cases[index]
+                row = {'index': index, **{name: getattr(params, name) for name in names}}
+                if error:
+                    summary['failed'] += 1
+                    row.update(status='failed', error=error)
+                else:
+                    row.update(zip(RESULT_COLUMNS, values), status='ok', error='')
+                writer.write(row, case_sequences)
+
+                summary['completed'] += 1
+                if summary['completed'] % progress_every == 0:
+                    progress(summary['completed'], len(tasks), time.perf_counter() - start)
+
+    progress(summary['completed'], len(tasks), time.perf_counter() - start)
+    return summary
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run_sweep(DEFAULT_GRID, "sweep_results.csv")
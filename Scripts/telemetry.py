@@ -0,0 +1,184 @@
+"""
+Telemetry Module
+
+This module records where the time of sizing runs goes. Every stage of a run
+(profile load, model build, solve, result processing, and in the GUIs plotting
+and the financial analysis) is timed and reported as a StageEvent with its
+duration, the change of the resident memory and stage-specific figures such as
+the size of the LP (variables, constraints, nonzeros) or the time spent inside
+the solver versus writing or transferring the model.
+
+Events go to the callbacks subscribed to a Telemetry object and, optionally, to
+a JSON-lines file with one event per line.
+
+The module contains the following components:
+- StageEvent: Duration, memory and details of one stage of a run.
+- Telemetry: Times stages and passes their events to the subscribed callbacks.
+- JsonLinesSink: Callback appending events to a JSON-lines file.
+- log_event: Callback logging an event in one line.
+- from_environment: Telemetry of the GUIs, logging and writing to $ECOSIZER_TELEMETRY.
+- rss_mb / peak_rss_mb: Current and peak resident memory of the process.
+
+Usage:
+1. Create Telemetry(), subscribe callbacks or pass jsonl_path="runs.jsonl".
+2. Pass it to SizingEngine(telemetry=...); every stage of size() emits an event.
+3. Time own stages with `with telemetry.stage("plot"): ...`.
+
+"""
+
+
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+
+
+# Environment variable naming the JSON-lines file of the GUIs' telemetry
+TELEMETRY_ENV = "ECOSIZER_TELEMETRY"
+
+
+def rss_mb():
+    """Return the current resident set size in MB, or None if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB, or None."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class StageEvent:
+    """
+    One timed stage of a run.
+
+    `run` identifies the sizing run the stage belongs to (one call of
+    SizingEngine.size), `started` is the wall-clock time in seconds since the
+    epoch, `seconds` the duration and `memory_delta_mb` the change of the
+    resident memory over the stage (None where it cannot be read). `details`
+    holds the figures of the stage, e.g. the LP size after the build.
+    """
+    stage: str
+    seconds: float
+    run: str = None
+    started: float = None
+    memory_mb: float = None
+    memory_delta_mb: float = None
+    details: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class JsonLinesSink:
+    """
+    Appends every event as one JSON line to a file.
+
+    Every line is written with a single append, so several processes (e.g. the
+    workers of a sweep) can share the file, and the sink can be pickled along
+    with the engine arguments of worker processes.
+
+    Parameters:
+    -----------
+        path: str
+            File the events are appended to; lines are flushed as they are written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, event):
+        line = json.dumps(event.to_dict(), default=str) + "\n"
+        with open(self.path, 'a') as f:
+            f.write(line)
+
+
+class Telemetry:
+    """
+    Times the stages of runs and emits a StageEvent for each of them.
+
+    Parameters:
+    -----------
+        callbacks: list of callable
+            Called with every StageEvent.
+        jsonl_path: str
+            Also append the events to this JSON-lines file.
+    """
+
+    def __init__(self, callbacks=None, jsonl_path=None):
+        self.callbacks = list(callbacks or [])
+        if jsonl_path:
+            self.callbacks.append(JsonLinesSink(jsonl_path))
+        self.run = None
+
+    def subscribe(self, callback):
+        """Call `callback` with every following event."""
+        self.callbacks.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.callbacks.remove(callback)
+
+    def new_run(self):
+        """Start a new run; the following events carry its id."""
+        self.run = uuid.uuid4().hex[:12]
+        return self.run
+
+    def emit(self, event):
+        """Pass an event to all callbacks; failing callbacks are logged and skipped."""
+        if event.run is None:
+            event.run = self.run
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:  # telemetry must never break a run
+                logging.warning(f"Telemetry callback {callback!r} failed: {e}")
+
+    @contextmanager
+    def stage(self, name, **details):
+        """
+        Time the enclosed block as stage `name`.
+
+        Yields the details dictionary of the event, so the block can add the
+        figures it computes; the event is emitted when the block is left, also
+        if it raises (with the error in the details).
+        """
+        memory_before = rss_mb()
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            yield details
+        except BaseException as e:
+            details['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            memory_after = rss_mb()
+            delta = None if memory_before is None or memory_after is None else memory_after - memory_before
+            self.emit(StageEvent(stage=name, seconds=seconds, started=started, memory_mb=memory_after,
+                                 memory_delta_mb=delta, details=details))
+
+
+def log_event(event):
+    """Callback logging an event in one line, e.g. for logging.basicConfig setups."""
+    extra = ", ".join(f"{key}={value}" for key, value in event.details.items())
+    memory = f", {event.memory_delta_mb:+.1f} MB" if event.memory_delta_mb is not None else ""
+    logging.info(f"Stage {event.stage}: {event.seconds:.3f} s{memory}" + (f" ({extra})" if extra else ""))
+
+
+def from_environment():
+    """Return a Telemetry logging every event, also writing them to $ECOSIZER_TELEMETRY if it is set."""
+    return Telemetry(callbacks=[log_event], jsonl_path=os.environ.get(TELEMETRY_ENV))